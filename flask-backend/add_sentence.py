@@ -1,8 +1,12 @@
+## Adds puzzles one at a time, for loading a whole file use puzzle_import.py
+
 import pymongo
 import random
 import string
 import os
 from dotenv import load_dotenv
+from difficulty import puzzleDifficulty
+from puzzle_import import sentenceHash
 
 
 load_dotenv()
@@ -44,6 +48,7 @@ def main():
         print(f"Category: {category}")
         print(f"Hint: {hint}")
         print(f"Revealed Letters: {showLetters}")
+        print(f"Difficulty: {puzzleDifficulty(sentence, showLetters)}")
 
         confirm = input("Is this okay? (type y): ").strip().lower()
         if confirm == 'y':
@@ -52,8 +57,11 @@ def main():
                 "category": category,
                 "hint": hint,
                 "letterMap": Lettermapping,
-                "revealedLetters": showLetters
+                "revealedLetters": showLetters,
+                "sentenceHash": sentenceHash(sentence),
+                "difficulty": puzzleDifficulty(sentence, showLetters)
             }
+            # the running backend picks it up on its next sentence pool refresh (see sentence_pool.py)
             collection.insert_one(doc)
             print("Saved successfully.")
         else:
@@ -1,7 +1,7 @@
 ## This is the main Flask backend for the CrackTheCode game.
 ## It handles user authentication, profile management, game scores, daily puzzles, endless puzzles, and a friend system.
 ## To run it, first ensure you have Flask, Flask-PyMongo, Flask-Bcrypt, Flask-JWT-Extended, and other dependencies installed.
-## Then run this script with Python this is how:
+## Then run this script with Python this is how (for more than one process use gunicorn, see gunicorn.conf.py):
 ## if you dont have the dependencies installed, run the following commands: pip install -r requirements.txt
 ## then run the following commands:
 ## cd flask-backend
@@ -9,21 +9,48 @@
 ## Python app.py
 
 # Flask Backend for CrackTheCode Game
-from flask import Flask, jsonify, request, send_from_directory
+from flask import Flask, Response, jsonify, request, send_from_directory
 from flask_pymongo import PyMongo
 from flask_bcrypt import Bcrypt
 from flask_jwt_extended import (
-    JWTManager, create_access_token, jwt_required, get_jwt_identity
+    JWTManager, create_access_token, jwt_required, get_jwt_identity, verify_jwt_in_request
 ) 
+from flask_jwt_extended.exceptions import JWTExtendedException
+from jwt.exceptions import PyJWTError
 from flask_cors import CORS
 from datetime import datetime, timedelta
 from dotenv import load_dotenv
-from werkzeug.utils import secure_filename
 from apscheduler.schedulers.background import BackgroundScheduler
+from pymongo.errors import BulkWriteError, DuplicateKeyError
+from bson import ObjectId
+from queue import Empty
 import os
 import random
-import requests
-import re
+import time
+
+from sentence_pool import SentencePool
+from leaderboard import Leaderboard
+from migrations import runMigrations
+from job_locks import runExclusive
+from streaks import resetMissedStreaks
+from daily_puzzle import getOrBuildPuzzle, pregenerateTomorrow
+from difficulty import backfillAll, bandEdges, difficultyFilter
+from chat import appendMessage, messagesSince
+from chat_hub import ChatHub, chatChannel, startRelay
+from search import prefixSearch, searchKey
+from cache import TTLCache
+from player_stats import getStats, recordRun, recordRuns
+from seen_puzzles import loadSeen, recordSeen
+from password_hashing import HashingBusy, HashingPool
+from profile_cards import ProfileCardCache
+from metrics import Metrics
+import json_provider
+from group_members import addMember, allMembers, groupsOf, isMember, listMembers, removeMember
+from friend_graph import (
+    FRIEND, RECEIVED, FriendshipError, acceptRequest, allFriends, denyRequest, friendCount,
+    listNames, mutualFriends, removeFriend, sendRequest
+)
+from profile_pictures import InvalidPicture, isHashedName, removeUnusedPicture, saveProfilePicture
 
 # This ensure loading the .env file, which is in gitignore.
 load_dotenv()
@@ -35,15 +62,104 @@ CORS(app, resources={r"/*": {"origins": "http://localhost:3000", "methods": ["GE
 # MongoDB and JWT configuration
 app.config["MONGO_URI"] = os.getenv("MONGO_URI")
 app.config["JWT_SECRET_KEY"] = os.getenv("JWT_SECRET_KEY", "default_dev_secret")
-
-mongo = PyMongo(app)
+# Tokens only come in the Authorization header, the chat stream is the one exception (it takes ?jwt=, see below)
+app.config["JWT_TOKEN_LOCATION"] = ["headers"]
+# bcrypt cost, hashes made with another cost are redone the next time the player logs in
+app.config["BCRYPT_LOG_ROUNDS"] = int(os.getenv("BCRYPT_ROUNDS", "12"))
+# Biggest request allowed (mostly for profile picture uploads)
+app.config["MAX_CONTENT_LENGTH"] = 10 * 1024 * 1024
+
+# Request timings and the Mongo commands per route, served on /metrics, see metrics.py
+metrics = Metrics(slow_ms=float(os.getenv("SLOW_REQUEST_MS", "0")))
+metrics.init_app(app)
+
+mongo = PyMongo(app, event_listeners=[metrics.commandListener()])
+
+# jsonify goes through orjson when it is installed and knows ObjectId/datetime, see json_provider.py
+# This has to come after PyMongo(app), its init_app puts its own BSON provider on app.json
+json_provider.init_app(app, timer=metrics.recordSerialization)
+if not isinstance(app.json, json_provider.MongoJSONProvider):
+    raise RuntimeError(f"app.json is {type(app.json).__name__}, the Mongo JSON provider was replaced")
 bcrypt = Bcrypt(app)
 jwt = JWTManager(app)
 
+# All password hashing goes through this bounded pool, see password_hashing.py
+passwords = HashingPool(
+    bcrypt,
+    rounds=app.config["BCRYPT_LOG_ROUNDS"],
+    workers=int(os.getenv("BCRYPT_WORKERS", "2")),
+    max_waiting=int(os.getenv("BCRYPT_MAX_WAITING", "16"))
+)
+
+# The endless puzzles are kept in memory, see sentence_pool.py
+sentencePool = SentencePool(mongo.db.sentences)
+
+# Best score per player, kept up to date by submitScore, see leaderboard.py
+leaderboard = Leaderboard(mongo.db)
+
+# Pushes new chat messages to the open chat windows, see chat_hub.py
+chatHub = ChatHub()
+# Without the change stream relay, how often an open chat stream checks MongoDB for messages posted through
+# another process. 0 (one process, like the dev server) never checks, every post goes through chatHub anyway.
+# The gunicorn configs set it when there is more than one process.
+CHAT_POLL_SECONDS = int(os.getenv("CHAT_POLL_SECONDS", "0"))
+
+# The seen filter of each logged in endless player, so /get-puzzle does not read it every time, see seen_puzzles.py
+# submitScore puts the new filter here straight from its write
+# About 5 KB per player, so only the 2000 most recent players are kept (a dropped one is read again from MongoDB)
+seenFilters = TTLCache(ttl=900, max_size=int(os.getenv("SEEN_FILTER_CACHE", "2000")))
+
+# Near-static collections (bogus hints, phone lines) are kept in memory for 10 minutes, see cache.py
+staticCache = TTLCache(ttl=600)
+
+# {username, picture} of players for friend lists and profiles, see profile_cards.py
+profileCards = ProfileCardCache(mongo.db.players)
+
+# The caches and the hashing pool report their counters on /metrics as well
+def collectingCounters():
+    for cacheName, stats in (("static", staticCache.stats()), ("profile_cards", profileCards.stats()), ("seen_filters", seenFilters.stats())):
+        yield "cache_hits_total", {"cache": cacheName}, stats["hits"]
+        yield "cache_misses_total", {"cache": cacheName}, stats["misses"]
+    for operation, t in passwords.stats().items():
+        yield "bcrypt_operations_total", {"operation": operation}, t["count"]
+        yield "bcrypt_seconds_total", {"operation": operation}, round(t["seconds"], 6)
+        yield "bcrypt_rejected_total", {"operation": operation}, t["rejected"]
+    yield "sentence_pool_size", {}, sentencePool.size()
+    yield "chat_stream_listeners", {}, chatHub.listeners()
+
+metrics.addCollector(collectingCounters)
+
+# Friends and group leaderboards are kept for 30 seconds per scope, so a busy group page is not one query per viewer
+# (at most 2000 scopes, the least recently viewed are dropped first)
+scopedBoards = TTLCache(ttl=30, max_size=2000)
+
+# When the hashing pool is full the request is turned away fast instead of waiting
+@app.errorhandler(HashingBusy)
+def hashingIsBusy(e):
+    return jsonify({"success": False, "error": str(e)}), 503, {"Retry-After": "1"}
+
 # Serve uploaded profile pictures from the uploads folder
+# The hashed thumbnails never change, so the browser can keep them for a year (old uploads only for an hour)
 @app.route('/static/uploads/<filename>')
 def serve_upload(filename):
-    return send_from_directory('static/uploads', filename)
+    if isHashedName(filename):
+        response = send_from_directory('static/uploads', filename, max_age=31536000, etag=True)
+        response.headers["Cache-Control"] = "public, max-age=31536000, immutable"
+        return response
+    return send_from_directory('static/uploads', filename, max_age=3600)
+
+# Prometheus style metrics: latency per route, status codes, payload sizes, Mongo commands and cache/hashing counters
+# All worker processes added up, ?scope=worker only shows the process that answers
+@app.route('/metrics', methods=['GET'])
+def showingMetrics():
+    if request.args.get("scope") == "worker":
+        return Response(metrics.render(), mimetype="text/plain; version=0.0.4")
+    try:
+        text = metrics.renderAll(mongo.db)
+    except Exception as e:
+        print(f"[METRICS] could not read the other workers, showing this one only: {e}")
+        text = metrics.render()
+    return Response(text, mimetype="text/plain; version=0.0.4")
 
 # Simple health check route to see if backend is running
 @app.route('/')
@@ -63,31 +179,33 @@ def signup():
     if not username or not password:
         return jsonify({"success": False, "error": "Username and password required"}), 400
     
-    # check if the username already exists, this ensures no duplicate usernames
-    if mongo.db.players.find_one({"username": username}):
+    # check if the username already exists, so we don't hash a password for nothing
+    if mongo.db.players.find_one({"username": username}, {"_id": 1}):
         return jsonify({"success": False, "error": "Sorry this username is taken, pick another"}), 409
     
 
     #bcrypt of the password, for safety 
-    hashingThatPassword = bcrypt.generate_password_hash(password).decode('utf-8')
+    hashingThatPassword = passwords.hash(password)
 
     # all thing that a new user have in the database 
     # !important remember to add new things here is implemented to the profile.
+    # (friends and friend requests live in the friendships collection, see friend_graph.py)
     players_data = {
         "username": username,
+        "searchKey": searchKey(username),
         "password": hashingThatPassword,
         "about": "This is your start text",
         "picture": "",
         "streak": {"current": 0, "longest": 0},
         "stamps": [],
-        "joined": datetime.utcnow().strftime("%d.%m.%Y"),
-        "sentRequests": [],
-        "friendRequests": [],
-        "friends": []
+        "joined": datetime.utcnow().strftime("%d.%m.%Y")
     }
 
-    # sending it to MongoDB
-    mongo.db.players.insert_one(players_data)
+    # sending it to MongoDB, the unique index on username catches two signups with the same name at once
+    try:
+        mongo.db.players.insert_one(players_data)
+    except DuplicateKeyError:
+        return jsonify({"success": False, "error": "Sorry this username is taken, pick another"}), 409
 
     # look for this message in console, to confirm it worked
     return jsonify({"success": True, "message": "Player has been created"}), 201
@@ -102,9 +220,18 @@ def login():
     # print(f"[LOGIN] has been attempted with {username}) ## Turn back, for troubleshooting
 
     # Checks if the player can be found in MongoDB 
-    player = mongo.db.players.find_one({"username": username})
-    if not player or not bcrypt.check_password_hash(player['password'], password):
+    player = mongo.db.players.find_one({"username": username}, {"_id": 0, "password": 1})
+    if not player or not passwords.check(player['password'], password):
         return jsonify({"error": "Invalid credentials or the Player does not exist"}), 401
+
+    # The bcrypt cost has changed since this password was saved, so it is hashed again now we know it
+    # When the pool is busy it is left for a later login, the password was right so the login goes through
+    if passwords.needsRehash(player['password']):
+        try:
+            mongo.db.players.update_one({"username": username}, {"$set": {"password": passwords.hash(password)}})
+        except HashingBusy:
+            pass
+
     token = create_access_token(identity=username)
     return jsonify({"access_token": token}), 200
 
@@ -122,11 +249,14 @@ def profile():
 @jwt_required()
 def GettingThePlayerProfile():
     currentProfile = get_jwt_identity()
-    PlayerProfile = mongo.db.players.find_one({"username": currentProfile}, {"_id": 0, "password": 0})
+    PlayerProfile = mongo.db.players.find_one({"username": currentProfile}, {"_id": 0, "password": 0, "searchKey": 0, "seen": 0})
     
     #goes wrong
     if not PlayerProfile:
         return jsonify(error="This players profile was not found"), 404
+
+    # the friend lists are paged from /get-friends, here is only the count
+    PlayerProfile["friendCount"] = friendCount(mongo.db, currentProfile)
     
     #goes right
     return jsonify(PlayerProfile), 200
@@ -142,10 +272,12 @@ def updatingAboutProfile():
     mongo.db.players.update_one(
         {"username": currentPlayer},
         {"$set": {"about": aboutField}})
+    profileCards.invalidate(currentPlayer)
     
     return jsonify(success=True, message="It was succesfull: Profile UPDATED"), 200
 
-# Uploading a player's profile picture
+# Uploading a player's profile picture, it is turned into thumbnails by profile_pictures.py
+# "picture" points at the large thumbnail and "pictures" has every size
 @app.route('/upload-profilepic', methods=['POST'])
 @jwt_required()
 def uploadingPicture():
@@ -154,25 +286,27 @@ def uploadingPicture():
     if not picProfile:
         return jsonify(error="There was no picture, that was uploaded"), 400
 
-    user = mongo.db.players.find_one({"username": username})
+    try:
+        pictures = saveProfilePicture(picProfile.read())
+    except InvalidPicture as e:
+        return jsonify(error=str(e)), 400
+    except TimeoutError:
+        return jsonify(error="The picture took too long to process, try a smaller one"), 503
 
-    # Remove old profile picture if it exists
-    if user and user.get("picture"):
-        oldProfilePic = user["picture"].replace("/static/uploads/", "")
-        oldProfilePicPath = os.path.join("static", "uploads", oldProfilePic)
-        if os.path.exists(oldProfilePicPath):
-            os.remove(oldProfilePicPath)
+    user = mongo.db.players.find_one_and_update(
+        {"username": username},
+        {"$set": {"picture": pictures["large"], "pictures": pictures}},
+        projection={"_id": 0, "picture": 1, "pictures": 1}
+    )
+
+    profileCards.invalidate(username)
 
-    # Saves the new profile picture
-    upload_folder = os.path.join("static", "uploads")
-    os.makedirs(upload_folder, exist_ok=True)
-    filename = secure_filename(f"{username}_{picProfile.filename}")
-    filepath = os.path.join(upload_folder, filename)
-    picProfile.save(filepath)
+    # Remove the old profile picture if nobody else uses it anymore
+    if user:
+        oldPictures = set((user.get("pictures") or {}).values()) | {user.get("picture")}
+        removeUnusedPicture(mongo.db, oldPictures - set(pictures.values()))
 
-    newProfilePicPath = f"/static/uploads/{filename}"
-    mongo.db.players.update_one({"username": username}, {"$set": {"picture": newProfilePicPath}})
-    return jsonify(success=True, picture=newProfilePicPath), 200
+    return jsonify(success=True, picture=pictures["large"], pictures=pictures), 200
 
 ## Score Handling
 
@@ -182,60 +316,206 @@ def uploadingPicture():
 def submitScore():
     PlayingPlayer = get_jwt_identity()
     ScoreData = request.json
+
+    # checked first, the body can be any JSON (a list or a number has no .get)
+    problem = scoreProblem(ScoreData)
+    if problem:
+        return jsonify(error=problem), 400
+
     score = ScoreData.get("score")
     sessionId = ScoreData.get("sessionId")
 
-    if not score or not sessionId:
-        return jsonify(error="Something is missing, either score or session ID"), 400
+    # the ids of the puzzles solved in this run, so they are not given again
+    solved = ScoreData.get("puzzles") or []
 
-    # Checking if the score has a valid number, so you can't spam send the same score
-    if mongo.db.scores.find_one({"username": PlayingPlayer, "sessionId": sessionId}):
+    # The unique index on username + sessionId ensures you can't spam send the same score
+    timestamp = ScoreData.get("timestamp", datetime.utcnow().isoformat())
+    try:
+        mongo.db.scores.insert_one({
+            "username": PlayingPlayer,
+            "score": score,  
+            "sessionId": sessionId, 
+            "timestamp": timestamp
+        })
+    except DuplicateKeyError:
         return jsonify(error="The score has already been sendt"), 409
 
-    mongo.db.scores.insert_one({
-        "username": PlayingPlayer,
-        "score": score,  
-        "sessionId": sessionId, 
-        "timestamp": ScoreData.get("timestamp", datetime.utcnow().isoformat())
-    })
+    # Only changes the leaderboard if this run beat the players best
+    leaderboard.record(PlayingPlayer, score, timestamp)
+    recordRun(mongo.db, PlayingPlayer, score, timestamp)
+    if solved:
+        seenFilters.put(PlayingPlayer, recordSeen(mongo.db, PlayingPlayer, solved))
 
     return jsonify({"success": True, "message": "The score was saved", "score": score}), 200
 
+# What is wrong with a submitted run, or None when it can be saved (shared by both submit routes)
+def scoreProblem(ScoreData):
+    if not isinstance(ScoreData, dict):
+        return "Every score has to be an object"
+    score = ScoreData.get("score")
+    if not score or not ScoreData.get("sessionId"):
+        return "Something is missing, either score or session ID"
+    if isinstance(score, bool) or not isinstance(score, (int, float)):
+        return "The score has to be a number"
+    solved = ScoreData.get("puzzles") or []
+    if not isinstance(solved, list) or len(solved) > 500:
+        return "puzzles has to be a list of puzzle ids"
+    timestamp = ScoreData.get("timestamp")
+    if timestamp is not None and (not isinstance(timestamp, str) or len(timestamp) > 64):
+        return "The timestamp has to be a date string"
+    return None
+
+# Submit many runs at once, for clients that queued them while offline
+# {"scores": [{score, sessionId, timestamp, puzzles}, ...]} -> one result per item, in the same order:
+# "saved", "duplicate" (that sessionId was already sent, so retrying is safe) or "invalid" with the error
+@app.route('/submit-scores', methods=['POST'])
+@jwt_required()
+def submitManyScores():
+    PlayingPlayer = get_jwt_identity()
+    items = (request.get_json(silent=True) or {}).get("scores")
+    if not isinstance(items, list) or not items:
+        return jsonify(error="scores has to be a list of runs"), 400
+    if len(items) > 100:
+        return jsonify(error="At most 100 scores at a time"), 400
+
+    results = [None] * len(items)
+    docs, positions = [], []
+    now = datetime.utcnow().isoformat()
+    for i, item in enumerate(items):
+        problem = scoreProblem(item)
+        if problem:
+            results[i] = {"status": "invalid", "error": problem}
+            continue
+        docs.append({
+            "username": PlayingPlayer,
+            "score": item["score"],
+            "sessionId": item["sessionId"],
+            "timestamp": item.get("timestamp", now)
+        })
+        positions.append(i)
+
+    # One insert for the whole batch, the unique index on username + sessionId turns resends into duplicates
+    failed = {}
+    if docs:
+        try:
+            mongo.db.scores.insert_many(docs, ordered=False)
+        except BulkWriteError as e:
+            for error in e.details.get("writeErrors", []):
+                failed[error["index"]] = "duplicate" if error.get("code") == 11000 else error.get("errmsg", "error")
+
+    saved = []
+    solved = []
+    for index, (doc, i) in enumerate(zip(docs, positions)):
+        if index not in failed:
+            results[i] = {"status": "saved", "sessionId": doc["sessionId"]}
+            saved.append(doc)
+            solved += items[i].get("puzzles") or []
+        elif failed[index] == "duplicate":
+            results[i] = {"status": "duplicate", "sessionId": doc["sessionId"]}
+        else:
+            results[i] = {"status": "invalid", "sessionId": doc["sessionId"], "error": failed[index]}
+
+    # Only the best new run can change the leaderboard, the stats get every run
+    if saved:
+        best = max(saved, key=lambda doc: doc["score"])
+        leaderboard.record(PlayingPlayer, best["score"], best["timestamp"])
+        recordRuns(mongo.db, PlayingPlayer, [(doc["score"], doc["timestamp"]) for doc in saved])
+    if solved:
+        seenFilters.put(PlayingPlayer, recordSeen(mongo.db, PlayingPlayer, solved))
+
+    return jsonify({"success": True, "saved": len(saved), "results": results}), 200
+
 # Getting all player highscores
 @app.route('/get-highscores', methods=['GET'])
 def getHighscores():
-    HighScores = list(mongo.db.scores.aggregate([
-        {"$group": {
-            "_id": "$username",
-            "best_score": {"$max": "$score"},
-            "timestamp": {"$first": "$timestamp"}
-        }},
-        {"$sort": {"best_score": -1}},
-        {"$limit": 250}
-    ]))
-
     formatted = [
-        {"username": entry["_id"], "score": entry["best_score"], "timestamp": entry["timestamp"]}
-        for entry in HighScores
+        {"username": entry["username"], "score": entry["score"], "timestamp": entry.get("timestamp")}
+        for entry in leaderboard.top()
     ]
 
     return jsonify({"success": True, "highscores": formatted}), 200
 
-# Get all scores for the current user, sorted by score
+# Turns leaderboard rows into the list the scoreboard page shows, with a rank on each row
+def rankedScores(entries):
+    return [
+        {"rank": i + 1, "username": entry["username"], "score": entry["score"], "timestamp": entry.get("timestamp")}
+        for i, entry in enumerate(entries)
+    ]
+
+# Getting the highscores of the current player and their friends
+@app.route('/get-highscores/friends', methods=['GET'])
+@jwt_required()
+def getFriendsHighscores():
+    player = get_jwt_identity()
+    formatted = scopedBoards.get(
+        f"friends:{player}",
+        lambda: rankedScores(leaderboard.scoped(allFriends(mongo.db, player) + [player]))
+    )
+    me = next((entry["rank"] for entry in formatted if entry["username"] == player), None)
+    return jsonify({"success": True, "highscores": formatted, "myRank": me}), 200
+
+# Getting the highscores of everyone in a group (only for members)
+@app.route('/get-highscores/group/<groupname>', methods=['GET'])
+@jwt_required()
+def getGroupHighscores(groupname):
+    player = get_jwt_identity()
+    if not isMember(mongo.db, groupname, player):
+        return jsonify({"success": False, "error": "Access denied"}), 403
+
+    formatted = scopedBoards.get(
+        f"group:{groupname}",
+        lambda: rankedScores(leaderboard.scoped(allMembers(mongo.db, groupname)))
+    )
+    me = next((entry["rank"] for entry in formatted if entry["username"] == player), None)
+    return jsonify({"success": True, "highscores": formatted, "myRank": me}), 200
+
+# Getting the place of the current player on the global list
+@app.route('/my-rank', methods=['GET'])
+@jwt_required()
+def getMyRank():
+    player = get_jwt_identity()
+    return jsonify({"success": True, "rank": leaderboard.rankOf(player)}), 200
+
+# Get the scores of the current user sorted by score, one page at a time
+# ?limit= sets the page size (50 by default) and ?after=<cursor> from "next" gets the next page
 @app.route('/loggedin-player-scores', methods=['GET'])
 @jwt_required()
 def GetCurrentPlayerScores():
     PlayerThatIsLoggedIN = get_jwt_identity()
+    limit = max(1, min(request.args.get("limit", 50, type=int), 500))
+
+    # the cursor is "<score>:<_id>" of the last row, so rows with the same score are not skipped
+    query = {"username": PlayerThatIsLoggedIN}
+    after = request.args.get("after")
+    if after:
+        lastScore, _, lastId = after.rpartition(":")
+        try:
+            lastScore = float(lastScore)
+            lastId = ObjectId(lastId)
+        except Exception:
+            return jsonify(success=False, error="Invalid cursor"), 400
+        query["$or"] = [{"score": {"$lt": lastScore}}, {"score": lastScore, "_id": {"$lt": lastId}}]
+
     ThatPlayerScores = list(
-        mongo.db.scores.find({"username": PlayerThatIsLoggedIN}).sort("score", -1))
+        mongo.db.scores.find(query, {"score": 1, "timestamp": 1})
+        .sort([("score", -1), ("_id", -1)]).limit(limit + 1))
+    nextCursor = None
+    if len(ThatPlayerScores) > limit:
+        last = ThatPlayerScores[limit - 1]
+        nextCursor = f"{last['score']}:{last['_id']}"
+
     formatted = [
         {"score": entry["score"], "timestamp": entry.get("timestamp", "")}
-        for entry in ThatPlayerScores
+        for entry in ThatPlayerScores[:limit]
     ]
 
-    print(f"[MY SCORES] {PlayerThatIsLoggedIN} has {len(formatted)} scores")
+    return jsonify(success=True, scores=formatted, next=nextCursor), 200
 
-    return jsonify(success=True, scores=formatted), 200
+# Get the summary of the current user's runs (total runs, best, mean, histogram, recent trend), see player_stats.py
+@app.route('/loggedin-player-stats', methods=['GET'])
+@jwt_required()
+def GetCurrentPlayerStats():
+    return jsonify(success=True, stats=getStats(mongo.db, get_jwt_identity())), 200
 
 ## Daily Puzzle Sentence
 # Getter for the daily sentence and getting a new one if there is not made on for this day
@@ -251,31 +531,11 @@ def getDailyPuzzle():
     if existing_attempt:
         return jsonify({"error": "This Player has already played it"}), 403
 
-    # Generate a new daily puzzle, if they has not been created on yet #Congratsyouarethefirst
-    existingSentence = mongo.db.daily_sentence.find_one({"date": WhatDateIsITToday})
-    if not existingSentence:
-        try: # Getting the puzzle from ZenQuotes API, and getting turn into a Code Sentence
-            response = requests.get("https://zenquotes.io/api/random")
-            quote_data = response.json()[0]
-            sentenceUntouched = quote_data.get("q", "")
-            Coded_sentence = re.sub(r"[^a-zA-Z ]", "", sentenceUntouched)
-
-            Codedletters = sorted(set(Coded_sentence.replace(" ", "").lower()))
-            letter_map = {char: str(i + 1) for i, char in enumerate(Codedletters)}
-            revealed_letters = random.sample(Codedletters, min(2, len(Codedletters)))
-
-            doc = {
-                "date": WhatDateIsITToday,
-                "sentence": Coded_sentence,
-                "hint": f"By {quote_data.get('a', 'Unknown')}",
-                "revealedLetters": revealed_letters,
-                "letterMap": letter_map
-            }
-            mongo.db.daily_sentence.insert_one(doc)
-        except Exception as e:
-            return jsonify({"error": "Failed to generate daily puzzle", "details": str(e)}), 500
-    else:
-        doc = existingSentence
+    # Normally the scheduler has made it already, if not the first request builds it #Congratsyouarethefirst
+    try:
+        doc = getOrBuildPuzzle(mongo.db, WhatDateIsITToday)
+    except Exception as e:
+        return jsonify({"error": "Failed to generate daily puzzle", "details": str(e)}), 500
 
     return jsonify(doc)
 
@@ -286,11 +546,12 @@ def completingDailyPuzzle():
     player = get_jwt_identity()
     TodayIs = datetime.utcnow().strftime('%Y-%m-%d')
 
-    if mongo.db.daily_attempts.find_one({"username": player, "date": TodayIs}):
+    # The unique index on username + date stops the same player completing it twice
+    try:
+        mongo.db.daily_attempts.insert_one({"username": player, "date": TodayIs})
+    except DuplicateKeyError:
         return jsonify({"success": False, "message": "Already completed it today, come back tomorrow"}), 400
 
-    mongo.db.daily_attempts.insert_one({"username": player, "date": TodayIs})
-
     yesterday = (datetime.utcnow() - timedelta(days=1)).strftime('%Y-%m-%d')
     played_yesterday = mongo.db.daily_attempts.find_one({
         "username": player,
@@ -324,70 +585,129 @@ def completingDailyPuzzle():
 ## Endless Game Puzzles - first one made and baseline for all the other gamesmode
 
 # Get a random puzzle from the endless pool
+# ?difficulty=easy|medium|hard only picks puzzles in that band (see difficulty.py)
+# Logged in players don't get the puzzles they have already solved (see seen_puzzles.py)
+# An expired or broken token is treated like no token, so endless mode keeps working for guests with an old login
 @app.route('/get-puzzle', methods=['GET'])
 def GetAEndlessPuzzle():
-    AllSentencesInEndless = list(mongo.db.sentences.find())
+    try:
+        verify_jwt_in_request(optional=True)
+        player = get_jwt_identity()
+    except (JWTExtendedException, PyJWTError):
+        player = None
+    seen = seenFilters.get(player, lambda: loadSeen(mongo.db, player)) if player else None
 
-    if not AllSentencesInEndless:
+    # Getting a random puzzle from the pool, so it ensure the player does not always get the same
+    try:
+        puzzle = sentencePool.pick(request.args.get("difficulty"), seen)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    # also not again in this run, before the score with it is submitted
+    if puzzle and seen is not None:
+        seen.add(puzzle["id"])
+
+    if not puzzle:
         return jsonify({"error": "No puzzles found - check if server is connected"}), 404
-    
-    # Getting a random puzzle, so it ensure the player does not always get the same
-    puzzle = random.choice(AllSentencesInEndless)
-    return jsonify({
-        "category": puzzle.get("category", "General"),
-        "hint": puzzle.get("hint", ""),
-        "sentence": puzzle.get("sentence", ""),
-        "revealedLetters": puzzle.get("revealedLetters", []),
-        "letterMap": puzzle.get("letterMap", {})
-    }), 200
+
+    return jsonify(puzzle), 200
 
 ## Category Puzzles
 
-# Get all puzzles for a specific category
+# The categories the frontend knows and the collection each one is saved in
+CATEGORY_COLLECTIONS = {
+    "DOTA": "Dota",
+    "EARTH": "Earth",
+    "LORUM IPSUM": "LORUM_IPSUM",
+    "MEDSOE": "Medsoe",
+    "SCIENCE": "Science"
+}
+# Where the difficulty bands of a category split, saved by the nightly backfill and cached like the hints
+def categoryBandFilter(collection, band):
+    return difficultyFilter(band, staticCache.get(f"bands:{collection.name}", lambda: bandEdges(collection)))
+
+CATEGORY_FIELDS = {"_id": 0, "sentence": 1, "category": 1, "hint": 1, "letterMap": 1, "revealedLetters": 1, "difficulty": 1}
+
+# Get the puzzles for a specific category
+# ?limit=<n>&after=<cursor> gives one page at a time, sorted by _id, with the cursor for the next page in "next"
+# ?format=ndjson streams every puzzle as one JSON line, so big categories never sit in memory
+# ?difficulty=easy|medium|hard only gives the puzzles in that band, together with any of the above
+# with no parameters all puzzles are sent in one list, like before
 @app.route('/get-category/<category>', methods=['GET'])
 def getterOfCategoryPuzzles(category):
     try:
-        collection_map = {
-            "DOTA": "Dota",
-            "EARTH": "Earth",
-            "LORUM IPSUM": "LORUM_IPSUM",
-            "MEDSOE": "Medsoe",
-            "SCIENCE": "Science"
-        }
-        if category not in collection_map:
+        if category not in CATEGORY_COLLECTIONS:
             return jsonify({"success": False, "error": "That category does not exist, how did you find it?"}), 404
-        
-        collection_name = collection_map[category]
-        CategorySentences = list(mongo.db[collection_name].find({}, {'_id': 0}))
+        collection = mongo.db[CATEGORY_COLLECTIONS[category]]
+
+        try:
+            bandQuery = categoryBandFilter(collection, request.args.get("difficulty")) or {}
+        except ValueError as e:
+            return jsonify({"success": False, "error": str(e)}), 400
+
+        if request.args.get("format") == "ndjson":
+            def lines():
+                for doc in collection.find(bandQuery, CATEGORY_FIELDS).sort("_id", 1).batch_size(200):
+                    yield app.json.dumps(doc) + "\n"
+            return Response(lines(), mimetype="application/x-ndjson")
+
+        if "limit" in request.args or "after" in request.args:
+            limit = max(1, min(request.args.get("limit", 20, type=int), 200))
+            query = dict(bandQuery)
+            after = request.args.get("after")
+            if after:
+                if not ObjectId.is_valid(after):
+                    return jsonify({"success": False, "error": "Invalid cursor"}), 400
+                query["_id"] = {"$gt": ObjectId(after)}
+
+            page = list(collection.find(query, dict(CATEGORY_FIELDS, _id=1)).sort("_id", 1).limit(limit + 1))
+            nextCursor = str(page[limit - 1]["_id"]) if len(page) > limit else None
+            page = page[:limit]
+            for doc in page:
+                del doc["_id"]
+            return jsonify({"success": True, "sentences": page, "next": nextCursor}), 200
+
+        CategorySentences = list(collection.find(bandQuery, {'_id': 0}))
         return jsonify({"success": True, "sentences": CategorySentences}), 200
     except Exception as e:
         return jsonify({"success": False, "error": str(e)}), 500
+
+# Get how many puzzles a category has, so the frontend can show progress before everything is loaded
+# takes ?difficulty= like the route above
+@app.route('/get-category/<category>/count', methods=['GET'])
+def countingCategoryPuzzles(category):
+    if category not in CATEGORY_COLLECTIONS:
+        return jsonify({"success": False, "error": "That category does not exist, how did you find it?"}), 404
+    collection = mongo.db[CATEGORY_COLLECTIONS[category]]
+    try:
+        bandQuery = categoryBandFilter(collection, request.args.get("difficulty")) or {}
+    except ValueError as e:
+        return jsonify({"success": False, "error": str(e)}), 400
+    count = collection.count_documents(bandQuery)
+    return jsonify({"success": True, "count": count}), 200
   
 
 ## Friend System - all the routes leads to new friendship aka this section handles the friend system
 
-# Search for users by username (excluding yourself)
+# Search for users whose username starts with the query (excluding yourself), see search.py
+# ?after=<cursor> gets the next page and ?limit= sets the page size
 @app.route('/search-players/<query>', methods=['GET'])
 @jwt_required()
 def searchPlayers(query):
     CurrentPlayer = get_jwt_identity()
-    print(f"[SEARCH] {CurrentPlayer} searched for '{query}'")
     if not query.strip():
-        print("[SEARCH] Empty query, returning empty list.")
-        return jsonify({"success": True, "users": []}), 200
-    players = mongo.db.players.find(
-        {
-            "username": {
-                "$regex": query,
-                "$options": "i",
-                "$ne": CurrentPlayer
-            }
-        },
-        {"_id": 0, "username": 1, "picture": 1}
-    )
-    players_list = list(players)
-    print(f"[SEARCH RESULT] Found: {players_list}")
-    return jsonify({"success": True, "users": players_list}), 200
+        return jsonify({"success": True, "users": [], "next": None}), 200
+    try:
+        players_list, nextCursor = prefixSearch(
+            mongo.db.players, query,
+            {"_id": 0, "username": 1, "picture": 1},
+            after=request.args.get("after"),
+            limit=request.args.get("limit"),
+            extra={"username": {"$ne": CurrentPlayer}}
+        )
+    except ValueError as e:
+        return jsonify({"success": False, "error": str(e)}), 400
+    return jsonify({"success": True, "users": players_list, "next": nextCursor}), 200
 
 # Send a friend request to another player
 @app.route('/send-friend-request', methods=['POST'])
@@ -400,50 +720,52 @@ def sendFriendRequest():
     if targetOfFriendShipUsername == player:
         return jsonify(error="You cant have yourself as a friend"), 400
 
-    senderOfFriendship = mongo.db.players.find_one({"username": player})
-    receiverOfFriendshio = mongo.db.players.find_one({"username": targetOfFriendShipUsername})
-
     # Player not found
-    if not receiverOfFriendshio:
+    if not mongo.db.players.find_one({"username": targetOfFriendShipUsername}, {"_id": 1}):
         return jsonify(error="Player cant be found"), 404
 
-    # A request has already been sent
-    if targetOfFriendShipUsername in senderOfFriendship.get("sentRequests", []):
-        return jsonify(error="It send, they have not answered"), 400
-
-    # Waiting for a response
-    if player in receiverOfFriendshio.get("friendRequests", []):
-        return jsonify(error="Request is pending, wait for an answer"), 400
-
-    mongo.db.players.update_one({"username": player}, {"$addToSet": {"sentRequests": targetOfFriendShipUsername}})
-    mongo.db.players.update_one({"username": targetOfFriendShipUsername}, {"$addToSet": {"friendRequests": player}})
+    # Already friends, already sent or waiting for a response
+    try:
+        status = sendRequest(mongo.db, player, targetOfFriendShipUsername)
+    except FriendshipError as e:
+        return jsonify(error=str(e)), 400
 
     # print(f"[FRIEND REQUEST] {player} ➡ {target}") # for troubleshooting
 
+    if status == FRIEND:
+        # they had asked as well, so it was accepted right away
+        return jsonify({"success": True, "message": "They asked you too, you are friends now"}), 200
     return jsonify({"success": True, "message": "Request sent"}), 200
 
-# Get all incoming friend requests for the current user
+# Get the incoming friend requests for the current user, ?after=<cursor>&limit= for the next pages
 @app.route('/friend-requests', methods=['GET'])
 @jwt_required()
 def getterForfriendRequests():
     player = get_jwt_identity()
-    OtherPlayer = mongo.db.players.find_one({"username": player})
-
-    requestsPending = OtherPlayer.get("friendRequests", [])
-    players = list(
-        mongo.db.players.find({"username": {"$in": requestsPending}}, {"_id": 0, "username": 1, "picture": 1})
-        ) 
-    return jsonify(success=True, friend_requests=players), 200
+    requestsPending, nextCursor = listNames(
+        mongo.db, player, RECEIVED, request.args.get("after"), request.args.get("limit")
+    )
+    players = profileCards.get_many(requestsPending)
+    return jsonify(success=True, friend_requests=players, next=nextCursor), 200
 
-# Get the current player's friends
+# Get the current player's friends, paged like the friend requests
 @app.route('/get-friends', methods=['GET'])
 @jwt_required()
 def gettingFriends():
     player = get_jwt_identity()
-    players = mongo.db.players.find_one({"username": player})
-    friends = players.get("friends", [])
-    formatted = list(mongo.db.players.find({"username": {"$in": friends}}, {"_id": 0, "username": 1, "picture": 1}))
-    return jsonify({"success": True, "friends": formatted}), 200
+    friends, nextCursor = listNames(
+        mongo.db, player, FRIEND, request.args.get("after"), request.args.get("limit")
+    )
+    formatted = profileCards.get_many(friends)
+    return jsonify({"success": True, "friends": formatted, "next": nextCursor}), 200
+
+# Get the friends the current player and another player have in common
+@app.route('/mutual-friends/<username>', methods=['GET'])
+@jwt_required()
+def gettingMutualFriends(username):
+    player = get_jwt_identity()
+    mutual = mutualFriends(mongo.db, player, username, request.args.get("limit"))
+    return jsonify({"success": True, "friends": profileCards.get_many(mutual)}), 200
 
 # Accept a friend request
 @app.route('/accept-friend-request', methods=['POST'])
@@ -452,15 +774,8 @@ def acceptingfriendship():
     player = get_jwt_identity()
     username = request.json.get("username")
 
-    mongo.db.players.update_one({"username": player}, {
-        "$pull": {"friendRequests": username},
-        "$addToSet": {"friends": username}
-    })
-
-    mongo.db.players.update_one({"username": username}, {
-        "$pull": {"sentRequests": player},
-        "$addToSet": {"friends": player}
-    })
+    if not acceptRequest(mongo.db, player, username):
+        return jsonify(success=False, error="There is no friend request from that player"), 404
 
     return jsonify(success=True, message="Friend request accepted"), 200
 
@@ -471,8 +786,7 @@ def deny_friend():
     player = get_jwt_identity()
     username = request.json.get("username")
 
-    mongo.db.players.update_one({"username": player}, {"$pull": {"friendRequests": username}})
-    mongo.db.players.update_one({"username": username}, {"$pull": {"sentRequests": player}})
+    denyRequest(mongo.db, player, username)
 
     return jsonify({"success": True, "message": "Friend request denied"}), 200
 
@@ -483,8 +797,7 @@ def remove_friend():
     player = get_jwt_identity()
     username = request.json.get("username")
 
-    mongo.db.players.update_one({"username": player}, {"$pull": {"friends": username}})
-    mongo.db.players.update_one({"username": username}, {"$pull": {"friends": player}})
+    removeFriend(mongo.db, player, username)
 
     return jsonify({"success": True, "message": f"{username} has been removed as your friend"}), 200
 
@@ -506,14 +819,22 @@ def createingGroup():
     if existing:
         return jsonify(error="Group name, that has been chosen is sadly already taken"), 409
 
-    hashed_password = bcrypt.generate_password_hash(password).decode('utf-8')
+    hashed_password = passwords.hash(password)
 
-    mongo.db.groups.insert_one({
-        "name": group_name,
-        "password": hashed_password,
-        "members": [player], # Start with the creator as the only member
-        "admin": player
-    })
+    # the unique index on name catches two groups being made with the same name at the same time
+    try:
+        mongo.db.groups.insert_one({
+            "name": group_name,
+            "searchKey": searchKey(group_name),
+            "password": hashed_password,
+            "memberCount": 0,
+            "admin": player
+        })
+    except DuplicateKeyError:
+        return jsonify(error="Group name, that has been chosen is sadly already taken"), 409
+
+    # Start with the creator as the only member (members live in group_members, see group_members.py)
+    addMember(mongo.db, group_name, player)
 
     # print(f"[GROUP CREATED] '{group_name}' and was created by {player}")
     ## Remove these comments if need to troubleshoot again
@@ -529,23 +850,18 @@ def joiningAGroup():
     group_name = data.get("name")
     password = data.get("password")
 
-    group = mongo.db.groups.find_one({"name": group_name})
+    group = mongo.db.groups.find_one({"name": group_name}, {"_id": 0, "password": 1})
     if not group:
         return jsonify(error="This group can not be found"), 404
 
     # this ensure that the password is correct
-    if not bcrypt.check_password_hash(group["password"], password):
+    if not passwords.check(group["password"], password):
         return jsonify(error="The password you have typed is invalid"), 403
 
     # already in the group
-    if player in group.get("members", []):
+    if not addMember(mongo.db, group_name, player):
         return jsonify(error="You are in this group already"), 400
 
-    mongo.db.groups.update_one(
-        {"name": group_name},
-        {"$addToSet": {"members": player}}
-    )
-
     return jsonify({"success": True, "message": "Joined group"}), 200
 
 # Remove a member from a group (admin only) - think gandalf the grey and the balrog "You shall not pass!"
@@ -557,71 +873,132 @@ def remove_member():
     group_name = data.get("group")
     target_user = data.get("username")
 
-    group = mongo.db.groups.find_one({"name": group_name})
+    group = mongo.db.groups.find_one({"name": group_name}, {"_id": 0, "admin": 1})
     if not group:
         return jsonify({"success": False, "error": "Group not found"}), 404
 
     if group.get("admin") != player:
         return jsonify({"success": False, "error": "Only admin can remove members"}), 403
 
-    mongo.db.groups.update_one(
-        {"name": group_name},
-        {"$pull": {"members": target_user}}
-    )
+    removeMember(mongo.db, group_name, target_user)
 
     return jsonify({"success": True, "message": "Member removed"}), 200
 
-# Search for groups by name with case-insensitive matching
+# Search for groups whose name starts with the query (case-insensitive), paged like searchPlayers
 @app.route('/search-groups/<query>', methods=['GET'])
 @jwt_required()
 def search_groups(query):
-    groups = mongo.db.groups.find(
-        {"name": {"$regex": query, "$options": "i"}},
-        {"_id": 0, "name": 1}
-    )
-    return jsonify({"success": True, "groups": list(groups)}), 200
-
-# Get all groups the current user is a member of
+    try:
+        groups, nextCursor = prefixSearch(
+            mongo.db.groups, query,
+            {"_id": 0, "name": 1},
+            after=request.args.get("after"),
+            limit=request.args.get("limit")
+        )
+    except ValueError as e:
+        return jsonify({"success": False, "error": str(e)}), 400
+    return jsonify({"success": True, "groups": groups, "next": nextCursor}), 200
+
+# Get all groups the current user is a member of, with the member count instead of every member
 @app.route('/players-groups', methods=['GET'])
 @jwt_required()
 def Playersgroups():
     player = get_jwt_identity()
     groups = list(mongo.db.groups.find(
-        {"members": player},
-        {"_id": 0, "name": 1, "admin": 1, "members": 1}
-    ))
+        {"name": {"$in": groupsOf(mongo.db, player)}},
+        {"_id": 0, "name": 1, "admin": 1, "memberCount": 1}
+    ).sort("name", 1))
     return jsonify({"success": True, "groups": groups}), 200
 
-# Get all members of a specific group
+# Get the members of a specific group, one page at a time (?after=<cursor>&limit=)
 @app.route('/group-members/<groupname>', methods=['GET'])
 @jwt_required()
 def gettingTheGroupMembers(groupname):
-    group = mongo.db.groups.find_one({"name": groupname})
+    group = mongo.db.groups.find_one({"name": groupname}, {"_id": 0, "memberCount": 1})
     if not group:
         return jsonify({"success": False, "error": "Group not found"}), 404
 
-    return jsonify({"success": True, "members": group.get("members", [])}), 200
+    members, nextCursor = listMembers(mongo.db, groupname, request.args.get("after"), request.args.get("limit"))
+    return jsonify({"success": True, "members": members, "memberCount": group.get("memberCount", 0), "next": nextCursor}), 200
 
 ## Chat System - the chat system allows users to communicate with friends and groups in profile page
 
-# Get chat messages for a friend or group chat
+# Checks that the player may read and write in the chat (friend chats are open, groups only for members)
+def canUseChat(player, chat_type, target):
+    if chat_type == 'friend':
+        return True
+    return isMember(mongo.db, target, player)
+
+# Get chat messages for a friend or group chat, with ?since=<seq> only the newer messages are sent
 @app.route('/chat/<chat_type>/<target>', methods=['GET'])
 @jwt_required()
 def gettingThechat(chat_type, target):
     player = get_jwt_identity()
 
-    if chat_type == 'friend':
-        key = sorted([player, target])
-        chat = mongo.db.friend_chats.find_one({"participants": key})
-        messages = chat.get('messages', []) if chat else []
-    else:
-        group = mongo.db.groups.find_one({"name": target})
-        if not group or player not in group.get('members', []):
-            return jsonify({"success": False, "error": "Access denied"}), 403
-        chat = mongo.db.group_chats.find_one({"group": target})
-        messages = chat.get('messages', []) if chat else []
+    since = request.args.get('since', type=int)
+
+    if not canUseChat(player, chat_type, target):
+        return jsonify({"success": False, "error": "Access denied"}), 403
+
+    messages, seq = messagesSince(mongo.db, chat_type, player, target, since)
+    return jsonify({"success": True, "messages": messages, "seq": seq}), 200
+
+# Live chat - a Server-Sent Events stream that gets new messages pushed as soon as they are posted
+# Missed messages are sent first, from Last-Event-ID (set by the browser on reconnect) or ?since=
+# EventSource can't send headers, so only this route takes the token as ?jwt=
+@app.route('/chat/<chat_type>/<target>/stream', methods=['GET'])
+@jwt_required(locations=["query_string"])
+def streamingThechat(chat_type, target):
+    player = get_jwt_identity()
 
-    return jsonify({"success": True, "messages": messages}), 200
+    if chat_type not in ('friend', 'group'):
+        return jsonify({"success": False, "error": "Invalid chat type"}), 400
+    if not canUseChat(player, chat_type, target):
+        return jsonify({"success": False, "error": "Access denied"}), 403
+
+    since = request.headers.get('Last-Event-ID', type=int)
+    if since is None:
+        since = request.args.get('since', type=int)
+    channel = chatChannel(chat_type, player, target)
+
+    def events():
+        # subscribe before reading the missed ones, so nothing slips through in between
+        queue = chatHub.subscribe(channel)
+        try:
+            lastSeq = since
+            if since is None:
+                # start from the newest message, so the relay (which can send a whole chat) does not replay old ones
+                lastSeq = messagesSince(mongo.db, chat_type, player, target)[1]
+            else:
+                missed, _ = messagesSince(mongo.db, chat_type, player, target, since)
+                for message in missed:
+                    lastSeq = message["seq"]
+                    yield f"id: {message['seq']}\ndata: {app.json.dumps(message)}\n\n"
+
+            lastPoll = time.monotonic()
+            while True:
+                try:
+                    # with the relay running messages from other processes are pushed too, without it they are polled for
+                    message = queue.get(timeout=15 if chatHub.relaying or not CHAT_POLL_SECONDS else min(15, CHAT_POLL_SECONDS))
+                except Empty:
+                    # a message posted through another worker process can only be missed here if the relay
+                    # is not running, so it is picked up from MongoDB now and then (an empty indexed read most of the time)
+                    if (CHAT_POLL_SECONDS and not chatHub.relaying and lastSeq is not None
+                            and time.monotonic() - lastPoll >= CHAT_POLL_SECONDS):
+                        lastPoll = time.monotonic()
+                        for missed in messagesSince(mongo.db, chat_type, player, target, lastSeq)[0]:
+                            lastSeq = missed["seq"]
+                            yield f"id: {missed['seq']}\ndata: {app.json.dumps(missed)}\n\n"
+                    yield ": keepalive\n\n"
+                    continue
+                if lastSeq is not None and message["seq"] <= lastSeq:
+                    continue
+                lastSeq = message["seq"]
+                yield f"id: {message['seq']}\ndata: {app.json.dumps(message)}\n\n"
+        finally:
+            chatHub.unsubscribe(channel, queue)
+
+    return Response(events(), mimetype='text/event-stream', headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
 
 # Post a new message to a friend or group chat (keeps only last 20 messages)
 @app.route('/chat/<chat_type>/<target>', methods=['POST'])
@@ -631,58 +1008,35 @@ def postingInChat(chat_type, target):
     data = request.get_json()
     message = data.get('message')
 
-    new_message = {
-        "sender": player,
-        "text": message
-    }
-
-    if chat_type == 'friend':
-        key = sorted([player, target])
-        chat = mongo.db.friend_chats.find_one({"participants": key})
-        if chat:
-            updated = chat["messages"][-19:] + [new_message] if len(chat["messages"]) >= 20 else chat["messages"] + [new_message]
-            mongo.db.friend_chats.update_one(
-                {"participants": key},
-                {"$set": {"messages": updated}}
-            )
-        else:
-            mongo.db.friend_chats.insert_one({"participants": key, "messages": [new_message]})
-    elif chat_type == 'group':
-        group = mongo.db.groups.find_one({"name": target})
-        if not group or player not in group.get('members', []):
-            return jsonify({"success": False, "error": "Access denied"}), 403
-
-        chat = mongo.db.group_chats.find_one({"group": target})
-        if chat:
-            updated = chat["messages"][-19:] + [new_message] if len(chat["messages"]) >= 20 else chat["messages"] + [new_message]
-            mongo.db.group_chats.update_one(
-                {"group": target},
-                {"$set": {"messages": updated}}
-            )
-        else:
-            mongo.db.group_chats.insert_one({"group": target, "messages": [new_message]})
-    else:
+    if chat_type not in ('friend', 'group'):
         return jsonify({"success": False, "error": "Invalid chat type"}), 400
+    if not canUseChat(player, chat_type, target):
+        return jsonify({"success": False, "error": "Access denied"}), 403
 
-    return jsonify({"success": True, "message": "Message sent"}), 200
+    new_message = appendMessage(mongo.db, chat_type, player, target, message)
+    chatHub.publish(chatChannel(chat_type, player, target), new_message)
+
+    return jsonify({"success": True, "message": "Message sent", "seq": new_message["seq"]}), 200
 
 ## Bogus hints - some random bogus hints to use in the game, some may ask why instead why the hell not
 
-# Get a random bogus hint from the database
+# Get a random bogus hint, the hints are cached so this does not touch MongoDB most of the time
 @app.route('/get-bogus-hint', methods=['GET'])
 def gettingbogushintFromHead():
-    allHints = list(mongo.db.hints.find())
+    allHints = staticCache.get("hints", lambda: list(mongo.db.hints.find({}, {"_id": 0})))
     if not allHints:
         return jsonify({"text": "No hints found."}), 404
     return jsonify(random.choice(allHints))
 
-# Get a random bogus phone line from detective
+# Get a random bogus phone line from detective (cached like the hints)
 @app.route('/phoneline', methods=['GET'])
 def getRandomphonelineFromDetective():
-    lines = list(mongo.db.phonelines.find())
+    lines = staticCache.get("phonelines", lambda: [
+        line.get("message", "") for line in mongo.db.phonelines.find({}, {"_id": 0, "message": 1})
+    ])
     if not lines:
         return jsonify({"success": False, "message": "No phone lines found."}), 404
-    return jsonify({"success": True, "message": random.choice(lines).get("message", "")})
+    return jsonify({"success": True, "message": random.choice(lines)})
 
 ## Public User - the getter for public profiles
 
@@ -692,49 +1046,56 @@ def getRandomphonelineFromDetective():
 def gettongTopublicprofile(username):
     OtherPlayer = mongo.db.players.find_one(
         {"username": username},
-        {"_id": 0, "password": 0, "sentRequests": 0, "friendRequests": 0}
+        {"_id": 0, "password": 0, "sentRequests": 0, "friendRequests": 0, "searchKey": 0, "seen": 0}
     )
     if not OtherPlayer:
         return jsonify({"success": False, "error": "User not found"}), 404
 
-    friend_usernames = OtherPlayer.get("friends", [])
-    friends = list(mongo.db.players.find(
-        {"username": {"$in": friend_usernames}},
-        {"_id": 0, "username": 1, "picture": 1}
-    ))
-
-    groups = list(mongo.db.groups.find(
-        {"members": username},
-        {"_id": 0, "name": 1}
-    ))
+    # the first page of friends comes with the profile, the rest is paged from /public-friends with "friendsNext"
+    friend_usernames, nextCursor = listNames(mongo.db, username, FRIEND)
+    friends = profileCards.get_many(friend_usernames)
 
     OtherPlayer["friends"] = friends
-    OtherPlayer["groups"] = [g["name"] for g in groups]
+    OtherPlayer["friendsNext"] = nextCursor
+    OtherPlayer["friendCount"] = friendCount(mongo.db, username)
+    OtherPlayer["groups"] = groupsOf(mongo.db, username)
 
     return jsonify({"success": True, "user": OtherPlayer}), 200
 
+# The next pages of a public profiles friends, ?after=<cursor>&limit= like /get-friends
+@app.route('/public-friends/<username>', methods=['GET'])
+@jwt_required()
+def publicFriends(username):
+    friends, nextCursor = listNames(
+        mongo.db, username, FRIEND, request.args.get("after"), request.args.get("limit")
+    )
+    return jsonify({"success": True, "friends": profileCards.get_many(friends), "next": nextCursor}), 200
+
 ## Streak Reset Scheduler - ensures users streaks are reset if they miss a daily puzzle
 
-# Every night, reset streaks for users who missed that day's puzzle
+# Every night, reset streaks for users who missed that day's puzzle (the bulk job lives in streaks.py)
 def resetstreaksfromplayers():
-    yesterday = (datetime.utcnow() - timedelta(days=1)).strftime('%Y-%m-%d')
-    players = mongo.db.players.find()
-    
-    for user in players:
-        name = user["username"]
-        playedToday = mongo.db.daily_attempts.find_one({"username": name, "date": yesterday})
-        if not playedToday:
-            mongo.db.players.update_one({"username": name}, {
-                "$set": {"streak.current": 0}
-            })
-            print(f"[STREAK RESET] {name}'s streak has been reset to 0 for missing yesterday's puzzle.")
+    resetMissedStreaks(mongo.db)
 
 
 
-# Schedule the streak reset to run daily at 00:05 UTC - this is 1:05 AM CET did not bother to change it
+# Every worker process runs the scheduler, but a job only runs in the one that gets its lease (see job_locks.py)
 scheduler = BackgroundScheduler()
-scheduler.add_job(func=resetstreaksfromplayers, trigger="cron", hour=0, minute=5)
-scheduler.start()
+# Schedule the streak reset to run daily at 00:05 UTC - this is 1:05 AM CET did not bother to change it
+scheduler.add_job(
+    func=lambda: runExclusive(mongo.db, "streak-reset", resetstreaksfromplayers),
+    trigger="cron", hour=0, minute=5
+)
+# Tomorrow's daily puzzle is made at 23:00 UTC, and checked again at 23:45 in case the first try failed
+scheduler.add_job(
+    func=lambda: runExclusive(mongo.db, "daily-puzzle", lambda: pregenerateTomorrow(mongo.db)),
+    trigger="cron", hour=23, minute="0,45"
+)
+# Puzzles added without going through puzzle_import.py get their difficulty score at 00:15 UTC
+scheduler.add_job(
+    func=lambda: runExclusive(mongo.db, "difficulty-backfill", lambda: backfillAll(mongo.db, ["sentences"] + list(CATEGORY_COLLECTIONS.values()))),
+    trigger="cron", hour=0, minute=15
+)
 
 ## Stamps - the categories being marked as completed for the user 
 
@@ -756,7 +1117,32 @@ def completeCategory():
 
     return jsonify({"success": True, "message": f"Category '{category}' recorded"}), 200
 
+## App Factory - the startup work that should not happen just by importing this file
+## wsgi.py calls this for gunicorn (see gunicorn.conf.py), and python app.py calls it for the dev server
+
+# gunicorn runs the migrations once in its master process (see gunicorn.conf.py), so the workers pass migrate=False
+def create_app(start_scheduler=True, migrate=True):
+    # Makes sure all the indexes exist before any requests comes in, see migrations.py
+    # The app does not start when a step fails, the later steps move the friends and members into their own
+    # collections, and the routes would show every player without friends or groups if those were skipped
+    if migrate:
+        try:
+            runMigrations(mongo.db)
+        except Exception as e:
+            print(f"[MIGRATION] failed, not starting until it is fixed: {e}")
+            raise RuntimeError(f"Migration failed: {e}") from e
+
+    if start_scheduler and not scheduler.running:
+        scheduler.start()
+
+    # started here and not on import, so every gunicorn worker gets its own threads after the fork
+    startRelay(chatHub, mongo.db)
+    metrics.startPublishing(mongo.db)
+    return app
+
 ## Start the Flask app - Look for print statements to confirm it's running
 if __name__ == '__main__':
     print("Starting Flask app on http://127.0.0.1:5000 - so it running now")
+    # the debug reloader runs this file twice, only the child process that serves requests starts the scheduler
+    create_app(start_scheduler=os.environ.get("WERKZEUG_RUN_MAIN") == "true")
     app.run(debug=True)
\ No newline at end of file
@@ -0,0 +1,348 @@
+## Benchmark - seeds a local MongoDB with made up players, scores, sentences, groups and chats,
+## then fires a mix of requests at the backend and reports throughput and p50/p95/p99 per route as JSON.
+## The results can be saved with --output and compared between commits.
+##
+## It needs a MongoDB you don't mind filling up, the database is dropped first (its name has to contain "bench"):
+## python benchmark.py --mongo-uri mongodb://localhost:27017/crackthecode_bench --players 2000 --duration 30
+##
+## By default the requests go straight into the Flask app in this process (no network in the numbers),
+## with --url http://127.0.0.1:5000 they are sent to a running server instead (seeded with the same --mongo-uri).
+##
+## In-process runs also report the JSON serialization time per endpoint. --json-backend stdlib runs the same load
+## with the json module instead of orjson, so the cost of serializing can be compared before and after.
+
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from urllib.parse import urlparse
+import argparse
+import json
+import math
+import os
+import random
+import string
+import subprocess
+import sys
+import time
+import uuid
+
+# route name -> weight, the share of requests each route gets
+DEFAULT_MIX = {
+    "get-puzzle": 30,
+    "get-highscores": 15,
+    "chat-read": 20,
+    "search-players": 15,
+    "daily-puzzle": 10,
+    "chat-post": 5,
+    "submit-score": 5,
+}
+
+
+def parseArgs():
+    parser = argparse.ArgumentParser(description="Load test for the CrackTheCode backend")
+    parser.add_argument("--mongo-uri", default="mongodb://localhost:27017/crackthecode_bench")
+    parser.add_argument("--url", help="send the requests to a running server instead of the app in this process")
+    parser.add_argument("--players", type=int, default=1000)
+    parser.add_argument("--scores-per-player", type=int, default=20)
+    parser.add_argument("--sentences", type=int, default=2000)
+    parser.add_argument("--groups", type=int, default=50)
+    parser.add_argument("--group-size", type=int, default=40)
+    parser.add_argument("--friends-per-player", type=int, default=15)
+    parser.add_argument("--duration", type=float, default=20, help="seconds to run for")
+    parser.add_argument("--threads", type=int, default=8)
+    parser.add_argument("--mix", help='route weights as JSON, e.g. \'{"get-puzzle": 1}\'')
+    parser.add_argument("--seed", type=int, default=1, help="random seed, so runs can be repeated")
+    parser.add_argument("--skip-seeding", action="store_true", help="reuse the data from the last run")
+    parser.add_argument("--output", help="file to write the JSON report to (printed when left out)")
+    parser.add_argument("--json-backend", choices=["orjson", "stdlib"], help="which encoder jsonify uses (in-process only)")
+    return parser.parse_args()
+
+
+def randomWord(rng, low=4, high=10):
+    return "".join(rng.choice(string.ascii_lowercase) for _ in range(rng.randint(low, high)))
+
+
+def randomSentence(rng):
+    return " ".join(randomWord(rng, 2, 8) for _ in range(rng.randint(4, 10))).capitalize()
+
+
+## Seeding
+
+def seedDatabase(db, args, rng):
+    from search import searchKey
+
+    for name in db.list_collection_names():
+        db.drop_collection(name)
+
+    now = datetime.utcnow()
+    names = [f"player{i:06d}" for i in range(args.players)]
+    # one hash for everybody, hashing a password per player would make seeding take minutes
+    from flask_bcrypt import Bcrypt
+    password = Bcrypt().generate_password_hash("benchmark", 4).decode("utf-8")
+
+    insertInChunks(db.players, ({
+        "username": name,
+        "searchKey": searchKey(name),
+        "password": password,
+        "about": "Benchmark player",
+        "picture": "",
+        "streak": {"current": rng.randint(0, 5), "longest": 5},
+        "stamps": [],
+        "joined": now.strftime("%d.%m.%Y")
+    } for name in names))
+
+    insertInChunks(db.scores, ({
+        "username": name,
+        "score": rng.randint(0, 60),
+        "sessionId": str(uuid.UUID(int=rng.getrandbits(128))),
+        "timestamp": (now - timedelta(minutes=rng.randint(0, 60 * 24 * 90))).isoformat()
+    } for name in names for _ in range(args.scores_per_player)))
+
+    def sentence():
+        text = randomSentence(rng)
+        unique = sorted(set(c for c in text.lower() if c.isalpha()))
+        return {
+            "sentence": text,
+            "category": "General",
+            "hint": randomWord(rng),
+            "letterMap": dict(zip(string.ascii_lowercase, rng.sample(range(1, 27), 26))),
+            "revealedLetters": rng.sample(unique, min(rng.randint(2, 4), len(unique)))
+        }
+    insertInChunks(db.sentences, (sentence() for _ in range(args.sentences)))
+
+    # friendships as edges in both directions (see friend_graph.py)
+    edges = {}
+    for name in names:
+        for other in rng.sample(names, min(args.friends_per_player, len(names))):
+            if other != name:
+                edges[(name, other)] = edges[(other, name)] = True
+    insertInChunks(db.friendships, ({"user": a, "other": b, "status": "friend", "since": now} for a, b in edges))
+
+    groups = [f"group{i:04d}" for i in range(args.groups)]
+    members = {g: rng.sample(names, min(args.group_size, len(names))) for g in groups}
+    insertInChunks(db.groups, ({
+        "name": g, "searchKey": searchKey(g), "password": password, "admin": members[g][0], "memberCount": len(members[g])
+    } for g in groups))
+    insertInChunks(db.group_members, ({"group": g, "username": m, "joined": now} for g in groups for m in members[g]))
+
+    def chat(messages_from):
+        return [{"sender": rng.choice(messages_from), "text": randomSentence(rng), "seq": i + 1} for i in range(20)]
+    insertInChunks(db.group_chats, ({"group": g, "messages": chat(members[g]), "seq": 20} for g in groups))
+    friendChats = {tuple(sorted(pair)) for pair in list(edges)[:args.players * 2]}
+    insertInChunks(db.friend_chats, ({"participants": list(pair), "messages": chat(list(pair)), "seq": 20} for pair in friendChats))
+
+    insertInChunks(db.hints, ({"text": randomSentence(rng)} for _ in range(50)))
+    insertInChunks(db.phonelines, ({"message": randomSentence(rng)} for _ in range(50)))
+
+    return {"players": names, "groups": members, "friendChats": sorted(friendChats)}
+
+
+def insertInChunks(collection, docs, size=5000):
+    chunk = []
+    for doc in docs:
+        chunk.append(doc)
+        if len(chunk) >= size:
+            collection.insert_many(chunk, ordered=False)
+            chunk = []
+    if chunk:
+        collection.insert_many(chunk, ordered=False)
+
+
+# Reads names back from the database, for --skip-seeding
+def loadWorld(db):
+    names = [p["username"] for p in db.players.find({}, {"_id": 0, "username": 1})]
+    members = {}
+    for m in db.group_members.find({}, {"_id": 0, "group": 1, "username": 1}):
+        members.setdefault(m["group"], []).append(m["username"])
+    chats = [tuple(c["participants"]) for c in db.friend_chats.find({}, {"_id": 0, "participants": 1}).limit(10000)]
+    return {"players": names, "groups": members, "friendChats": chats}
+
+
+## Requests
+
+# Makes one request for the given route as a random player, returns (status code, response size)
+def makeRequest(route, client, tokens, world, rng):
+    player = rng.choice(world["players"])
+    auth = {"Authorization": f"Bearer {tokens[player]}"}
+
+    if route == "get-puzzle":
+        return client("GET", "/get-puzzle")
+    if route == "get-highscores":
+        return client("GET", "/get-highscores")
+    if route == "daily-puzzle":
+        return client("GET", "/daily-puzzle", headers=auth)
+    if route == "search-players":
+        return client("GET", f"/search-players/{player[:rng.randint(3, 8)]}", headers=auth)
+    if route == "submit-score":
+        return client("POST", "/submit-score", headers=auth, json={
+            "score": rng.randint(1, 60), "sessionId": str(uuid.uuid4()), "timestamp": datetime.utcnow().isoformat()
+        })
+    if route in ("chat-read", "chat-post"):
+        if world["friendChats"] and rng.random() < 0.5:
+            a, b = rng.choice(world["friendChats"])
+            player, path = a, f"/chat/friend/{b}"
+        else:
+            group = rng.choice(list(world["groups"]))
+            player, path = rng.choice(world["groups"][group]), f"/chat/group/{group}"
+        auth = {"Authorization": f"Bearer {tokens[player]}"}
+        if route == "chat-read":
+            return client("GET", path, headers=auth)
+        return client("POST", path, headers=auth, json={"message": randomSentence(rng)})
+    raise ValueError(f"Unknown route in the mix: {route}")
+
+
+def inProcessClient(app):
+    testClient = app.test_client()
+
+    def send(method, path, headers=None, json=None):
+        response = testClient.open(path, method=method, headers=headers, json=json)
+        return response.status_code, len(response.get_data())
+    return send
+
+
+def httpClient(baseUrl):
+    import requests
+    session = requests.Session()
+
+    def send(method, path, headers=None, json=None):
+        response = session.request(method, baseUrl.rstrip("/") + path, headers=headers, json=json, timeout=30)
+        return response.status_code, len(response.content)
+    return send
+
+
+# p in 0-100, nearest rank on the sorted timings
+def percentile(sortedTimes, p):
+    if not sortedTimes:
+        return None
+    index = max(0, min(len(sortedTimes) - 1, math.ceil(p / 100 * len(sortedTimes)) - 1))
+    return sortedTimes[index]
+
+
+def runLoad(makeClient, tokens, world, mix, args):
+    routes = list(mix)
+    weights = [mix[r] for r in routes]
+    deadline = time.monotonic() + args.duration
+
+    def worker(n):
+        rng = random.Random(args.seed * 1000 + n)
+        client = makeClient()
+        results = []
+        while time.monotonic() < deadline:
+            route = rng.choices(routes, weights)[0]
+            started = time.perf_counter()
+            try:
+                status, size = makeRequest(route, client, tokens, world, rng)
+            except Exception as e:
+                status, size = type(e).__name__, 0
+            results.append((route, time.perf_counter() - started, status, size))
+        return results
+
+    started = time.monotonic()
+    with ThreadPoolExecutor(max_workers=args.threads) as pool:
+        results = [r for batch in pool.map(worker, range(args.threads)) for r in batch]
+    return results, time.monotonic() - started
+
+
+# Serialization time per endpoint from the apps metrics, only known when the app runs in this process
+def serializationReport(stats):
+    return {
+        endpoint: {
+            "responses": s["count"],
+            "total_ms": round(s["seconds"] * 1000, 3),
+            "mean_ms": round(s["seconds"] * 1000 / s["count"], 4) if s["count"] else None,
+        }
+        for endpoint, s in sorted(stats.items())
+    }
+
+
+def buildReport(results, elapsed, args, mix, serialization=None, jsonBackend=None):
+    routes = {}
+    for route, seconds, status, size in results:
+        r = routes.setdefault(route, {"times": [], "statuses": {}, "bytes": 0})
+        r["times"].append(seconds * 1000)
+        r["statuses"][str(status)] = r["statuses"].get(str(status), 0) + 1
+        r["bytes"] += size
+
+    report = {}
+    for route, r in sorted(routes.items()):
+        times = sorted(r["times"])
+        report[route] = {
+            "requests": len(times),
+            "throughput": round(len(times) / elapsed, 2),
+            "p50_ms": round(percentile(times, 50), 3),
+            "p95_ms": round(percentile(times, 95), 3),
+            "p99_ms": round(percentile(times, 99), 3),
+            "max_ms": round(times[-1], 3),
+            "mean_bytes": round(r["bytes"] / len(times), 1),
+            "statuses": r["statuses"],
+        }
+
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True).stdout.strip()
+    except OSError:
+        commit = None
+
+    return {
+        "commit": commit or None,
+        "startedAt": datetime.utcnow().isoformat(),
+        "mode": "http" if args.url else "in-process",
+        "scale": {
+            "players": args.players, "scoresPerPlayer": args.scores_per_player, "sentences": args.sentences,
+            "groups": args.groups, "groupSize": args.group_size, "friendsPerPlayer": args.friends_per_player
+        },
+        "threads": args.threads,
+        "seconds": round(elapsed, 2),
+        "mix": mix,
+        "total": {"requests": len(results), "throughput": round(len(results) / elapsed, 2)},
+        "routes": report,
+        "jsonBackend": jsonBackend,
+        "serialization": serialization,
+    }
+
+
+def main():
+    args = parseArgs()
+    mix = json.loads(args.mix) if args.mix else DEFAULT_MIX
+    rng = random.Random(args.seed)
+
+    dbName = urlparse(args.mongo_uri).path.lstrip("/")
+    if "bench" not in dbName:
+        sys.exit(f"The database name in --mongo-uri has to contain 'bench' (got '{dbName}'), it is dropped before seeding.")
+
+    import pymongo
+    db = pymongo.MongoClient(args.mongo_uri)[dbName]
+
+    if args.skip_seeding:
+        world = loadWorld(db)
+    else:
+        seeding = time.monotonic()
+        world = seedDatabase(db, args, rng)
+        print(f"[BENCH] seeded {dbName} in {time.monotonic() - seeding:.1f}s", file=sys.stderr)
+
+    # app.py reads the uri when it is imported, so it has to be set first
+    os.environ["MONGO_URI"] = args.mongo_uri
+    if args.json_backend:
+        os.environ["JSON_BACKEND"] = args.json_backend
+    import app as backend
+    backend.create_app(start_scheduler=False)
+
+    with backend.app.app_context():
+        from flask_jwt_extended import create_access_token
+        tokens = {name: create_access_token(identity=name, expires_delta=False) for name in world["players"]}
+
+    makeClient = (lambda: httpClient(args.url)) if args.url else (lambda: inProcessClient(backend.app))
+    results, elapsed = runLoad(makeClient, tokens, world, mix, args)
+    serialization = None if args.url else serializationReport(backend.metrics.serializationStats())
+    jsonBackend = None if args.url else getattr(backend.app.json, "backend", None)
+    report = buildReport(results, elapsed, args, mix, serialization, jsonBackend)
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output + "\n")
+        print(f"[BENCH] {report['total']['requests']} requests, report written to {args.output}", file=sys.stderr)
+    else:
+        print(output)
+
+
+if __name__ == "__main__":
+    main()
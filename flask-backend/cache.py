@@ -0,0 +1,52 @@
+## Cache - a small in-process cache with a time to live, for collections that are read a lot and almost never change.
+## get(key, load) returns the cached value, or calls load() and keeps the result for ttl seconds.
+## put() replaces a value that is already known, invalidate() throws one key (or everything) away,
+## and stats() gives the hit/miss counters.
+## It holds at most max_size keys, the least recently used go first (like ProfileCardCache).
+
+from collections import OrderedDict
+from threading import Lock
+import time
+
+
+class TTLCache:
+    def __init__(self, ttl=300, max_size=1000):
+        self.ttl = ttl
+        self.max_size = max_size
+        self.entries = OrderedDict()  # key -> (expires at, value), least recently used first
+        self.hits = 0
+        self.misses = 0
+        self.lock = Lock()
+
+    def get(self, key, load, ttl=None):
+        now = time.monotonic()
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry and entry[0] > now:
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+            self.misses += 1
+
+        # load outside the lock, two threads loading the same key at once is fine here
+        value = load()
+        self.put(key, value, ttl)
+        return value
+
+    def put(self, key, value, ttl=None):
+        with self.lock:
+            self.entries[key] = (time.monotonic() + (self.ttl if ttl is None else ttl), value)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_size:
+                self.entries.popitem(last=False)
+
+    def invalidate(self, key=None):
+        with self.lock:
+            if key is None:
+                self.entries.clear()
+            else:
+                self.entries.pop(key, None)
+
+    def stats(self):
+        with self.lock:
+            return {"hits": self.hits, "misses": self.misses, "keys": len(self.entries)}
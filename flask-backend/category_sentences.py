@@ -1,8 +1,12 @@
+## Adds puzzles one at a time, for loading a whole file use puzzle_import.py
+
 import pymongo
 import random
 import string
 import os
 from dotenv import load_dotenv
+from difficulty import puzzleDifficulty
+from puzzle_import import sentenceHash
 
 load_dotenv()
 MONGO_URI = os.getenv("MONGO_URI")
@@ -47,6 +51,7 @@ def main():
         print(f"Sentence: {sentence}")
         print(f"Hint: {hint}")
         print(f"Revealed: {Letterrevealed}")
+        print(f"Difficulty: {puzzleDifficulty(sentence, Letterrevealed)}")
         print("----------------")
 
         if input("Save it? (type y to save): ").strip().lower() == 'y':
@@ -55,7 +60,9 @@ def main():
                 "category": category,
                 "hint": hint,
                 "letterMap": lmap,
-                "revealedLetters": Letterrevealed
+                "revealedLetters": Letterrevealed,
+                "sentenceHash": sentenceHash(sentence),
+                "difficulty": puzzleDifficulty(sentence, Letterrevealed)
             })
             print("Sentences has been Saved")
         else:
@@ -0,0 +1,59 @@
+## Chat - the reads and writes for friend_chats and group_chats.
+## Every message gets a seq number from a counter on the chat document, so the frontend can ask for "messages since".
+## Posting is one update: bump the counter, add the message and cut the list down to the last 20, all at once.
+
+from pymongo import ReturnDocument
+
+CHAT_LENGTH = 20
+
+
+# The collection and the filter that finds the chat document
+def chatLocation(db, chat_type, player, target):
+    if chat_type == 'friend':
+        return db.friend_chats, {"participants": sorted([player, target])}
+    return db.group_chats, {"group": target}
+
+
+# Adds a message and returns it with its seq number
+# A pipeline update is used so the new seq can go into the message in the same write
+def appendMessage(db, chat_type, player, target, text):
+    collection, query = chatLocation(db, chat_type, player, target)
+    chat = collection.find_one_and_update(
+        query,
+        [
+            {"$set": {"seq": {"$add": [{"$ifNull": ["$seq", 0]}, 1]}}},
+            {"$set": {"messages": {"$slice": [
+                {"$concatArrays": [
+                    {"$ifNull": ["$messages", []]},
+                    [{"sender": {"$literal": player}, "text": {"$literal": text}, "seq": "$seq"}]
+                ]},
+                -CHAT_LENGTH
+            ]}}}
+        ],
+        upsert=True,
+        projection={"_id": 0, "seq": 1},
+        return_document=ReturnDocument.AFTER
+    )
+    return {"sender": player, "text": text, "seq": chat["seq"]}
+
+
+# The messages newer than since (all of them when since is None) and the latest seq
+# The filtering is done by MongoDB, so an up to date client gets an empty list back
+def messagesSince(db, chat_type, player, target, since=None):
+    collection, query = chatLocation(db, chat_type, player, target)
+
+    if since is None:
+        chat = collection.find_one(query, {"_id": 0, "messages": 1, "seq": 1})
+    else:
+        chat = collection.find_one(
+            dict(query, seq={"$gt": since}),
+            {"_id": 0, "seq": 1, "messages": {"$filter": {
+                "input": "$messages", "as": "m", "cond": {"$gt": ["$$m.seq", since]}
+            }}}
+        )
+        if not chat:
+            return [], since
+
+    if not chat:
+        return [], 0
+    return chat.get("messages", []), chat.get("seq", 0)
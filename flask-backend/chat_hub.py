@@ -0,0 +1,118 @@
+## Chat Hub - a small in-process pub/sub, so new chat messages can be pushed to open chat windows.
+## postingInChat publishes to the channel of the chat, and every /chat/.../stream connection has its own queue.
+## It only reaches clients connected to the same process, a reconnecting client gets missed messages from MongoDB.
+## With more than one process, startRelay watches the chat collections with a MongoDB change stream and publishes
+## the messages posted through the other processes as well (change streams need a replica set, like Atlas).
+
+from collections import OrderedDict
+from pymongo.errors import OperationFailure
+from queue import Queue, Full
+from threading import Lock, Thread
+import time
+
+
+# The channel name of a chat, friend chats use both names sorted so both players end up in the same one
+def chatChannel(chat_type, player, target):
+    if chat_type == 'friend':
+        return "friend:" + ":".join(sorted([player, target]))
+    return "group:" + target
+
+
+class ChatHub:
+    def __init__(self, queue_size=100):
+        self.queue_size = queue_size
+        self.channels = {}  # channel -> set of subscriber queues
+        self.lock = Lock()
+        self.relaying = False  # true while the change stream relay is running
+        self.relayThread = None
+
+    def subscribe(self, channel):
+        q = Queue(maxsize=self.queue_size)
+        with self.lock:
+            self.channels.setdefault(channel, set()).add(q)
+        return q
+
+    def unsubscribe(self, channel, q):
+        with self.lock:
+            subscribers = self.channels.get(channel)
+            if subscribers:
+                subscribers.discard(q)
+                if not subscribers:
+                    del self.channels[channel]
+
+    # Sends the message to everyone listening, a subscriber that is too far behind just misses it
+    # (it gets it from MongoDB when it reconnects)
+    def publish(self, channel, message):
+        with self.lock:
+            subscribers = list(self.channels.get(channel, ()))
+        for q in subscribers:
+            try:
+                q.put_nowait(message)
+            except Full:
+                pass
+        return len(subscribers)
+
+    def listeners(self):
+        with self.lock:
+            return sum(len(s) for s in self.channels.values())
+
+
+# How many chats the relay remembers the last published seq of
+RELAY_CHANNELS = 10000
+
+
+# The channel and the messages (oldest first) of a chat document from the change stream
+# The document is looked up when the event is read, so it can already hold several new messages
+def changedMessages(chat):
+    if "participants" in chat:
+        channel = "friend:" + ":".join(sorted(chat["participants"]))
+    elif "group" in chat:
+        channel = "group:" + chat["group"]
+    else:
+        return None, []
+    messages = [m for m in chat.get("messages", []) if m.get("seq") is not None]
+    return channel, sorted(messages, key=lambda m: m["seq"])
+
+
+# Publishes every message written to friend_chats/group_chats (by any process) to the hub, in a background thread
+# If the server has no change streams the relay stops, and the streams only pick those messages up when they poll
+def startRelay(hub, db):
+    if hub.relayThread is not None:
+        return
+
+    def relay():
+        pipeline = [{"$match": {
+            "ns.coll": {"$in": ["friend_chats", "group_chats"]},
+            "operationType": {"$in": ["insert", "update", "replace"]}
+        }}]
+        # channel -> highest seq published, so the messages of a document are only sent once
+        # (the streams drop the seqs they have already sent too, so forgetting a channel only resends a few)
+        published = OrderedDict()
+        while True:
+            try:
+                with db.watch(pipeline, full_document="updateLookup") as changes:
+                    hub.relaying = True
+                    for change in changes:
+                        channel, messages = changedMessages(change.get("fullDocument") or {})
+                        if not channel:
+                            continue
+                        last = published.get(channel)
+                        for message in messages:
+                            if last is None or message["seq"] > last:
+                                hub.publish(channel, message)
+                        if messages:
+                            published[channel] = max(messages[-1]["seq"], last or 0)
+                            published.move_to_end(channel)
+                            if len(published) > RELAY_CHANNELS:
+                                published.popitem(last=False)
+            except OperationFailure as e:
+                print(f"[CHAT RELAY] change streams are not available, messages from other processes come with the poll: {e}")
+                hub.relaying = False
+                return
+            except Exception as e:
+                print(f"[CHAT RELAY] lost the change stream, trying again: {e}")
+                hub.relaying = False
+                time.sleep(5)
+
+    hub.relayThread = Thread(target=relay, daemon=True, name="chat-relay")
+    hub.relayThread.start()
@@ -0,0 +1,100 @@
+## Daily Puzzle - builds the puzzle of the day ahead of time, so /daily-puzzle only has to read it.
+## The scheduler in app.py makes tomorrow's puzzle before midnight, using ZenQuotes if it answers quickly
+## and the local quotes.json if it is slow or down.
+## If a puzzle is still missing on the day, only one request builds it (lock + the unique index on date)
+## and it always uses the local quotes, so nobody waits on the API.
+
+from datetime import datetime, timedelta
+from pymongo.errors import DuplicateKeyError
+from threading import Lock
+import json
+import os
+import random
+import re
+import requests
+
+from difficulty import puzzleDifficulty
+
+QUOTES_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "quotes.json")
+ZENQUOTES_URL = "https://zenquotes.io/api/random"
+
+buildLock = Lock()
+localQuotes = None
+
+
+# Loads quotes.json once, every quote looks like {"q": "...", "a": "author"}
+def loadLocalQuotes():
+    global localQuotes
+    if localQuotes is None:
+        with open(QUOTES_FILE, encoding="utf-8") as f:
+            localQuotes = json.load(f)
+    return localQuotes
+
+
+# Picks a local quote, the date is used as seed so every process picks the same one for a day
+def localQuote(date):
+    return random.Random(date).choice(loadLocalQuotes())
+
+
+# Gets a quote from ZenQuotes, or from quotes.json if it takes too long or fails
+def fetchQuote(date, timeout=3):
+    try:
+        response = requests.get(ZENQUOTES_URL, timeout=timeout)
+        response.raise_for_status()
+        quote = response.json()[0]
+        if quote.get("q"):
+            return quote
+    except Exception as e:
+        print(f"[DAILY PUZZLE] ZenQuotes failed, using a local quote instead: {e}")
+    return localQuote(date)
+
+
+# Turns a quote into the Code Sentence for that date
+def buildPuzzle(quote, date):
+    Coded_sentence = re.sub(r"[^a-zA-Z ]", "", quote.get("q", ""))
+
+    Codedletters = sorted(set(Coded_sentence.replace(" ", "").lower()))
+    letter_map = {char: str(i + 1) for i, char in enumerate(Codedletters)}
+    revealed_letters = random.sample(Codedletters, min(2, len(Codedletters)))
+
+    return {
+        "date": date,
+        "sentence": Coded_sentence,
+        "hint": f"By {quote.get('a', 'Unknown')}",
+        "revealedLetters": revealed_letters,
+        "letterMap": letter_map,
+        "difficulty": puzzleDifficulty(Coded_sentence, revealed_letters)
+    }
+
+
+# Saves the puzzle unless another process got there first, and returns the one that is saved
+def savePuzzle(db, doc):
+    try:
+        db.daily_sentence.insert_one(dict(doc))
+    except DuplicateKeyError:
+        pass
+    return db.daily_sentence.find_one({"date": doc["date"]}, {"_id": 0})
+
+
+# The puzzle for a date, built with the local quotes if it is not there yet (used on the request path)
+def getOrBuildPuzzle(db, date):
+    puzzle = db.daily_sentence.find_one({"date": date}, {"_id": 0})
+    if puzzle:
+        return puzzle
+
+    # only one request in this process builds it, the others wait and then read it
+    with buildLock:
+        puzzle = db.daily_sentence.find_one({"date": date}, {"_id": 0})
+        if puzzle:
+            return puzzle
+        print(f"[DAILY PUZZLE] no puzzle for {date} was made ahead of time, building one now")
+        return savePuzzle(db, buildPuzzle(localQuote(date), date))
+
+
+# Scheduled job - makes the puzzle for the next day (UTC) if it does not exist yet
+def pregenerateTomorrow(db):
+    tomorrow = (datetime.utcnow() + timedelta(days=1)).strftime('%Y-%m-%d')
+    if db.daily_sentence.find_one({"date": tomorrow}, {"_id": 1}):
+        return
+    puzzle = savePuzzle(db, buildPuzzle(fetchQuote(tomorrow), tomorrow))
+    print(f"[DAILY PUZZLE] puzzle for {tomorrow} is ready: {puzzle['hint']}")
@@ -0,0 +1,146 @@
+## Difficulty - gives every puzzle a score from 0 (easy) to 100 (hard), saved as "difficulty" on the document.
+## The score is worked out once (puzzle_import.py, add_sentence.py, the daily puzzle and the backfill below),
+## and the puzzle collections have an index on it, so a difficulty band is a single indexed range query.
+##
+## The bands are thirds of each collection (easy is the easiest third), not fixed numbers, because real sentences
+## all land in a narrow part of the scale. The edges are worked out by the backfill job and saved in difficulty_bands.
+##
+## What makes a puzzle hard:
+## - many different letters to work out
+## - the letters are spread evenly (high entropy), so there are no obvious "e"s to start with
+## - a short sentence, so there are few words to guess from
+## - few of the letters are given away by revealedLetters
+##
+## python difficulty.py   (scores every puzzle that has no difficulty yet)
+
+from collections import Counter
+from datetime import datetime
+from pymongo import ASCENDING, UpdateOne
+import math
+
+# The bands the routes accept as ?difficulty=
+DIFFICULTY_BANDS = ("easy", "medium", "hard")
+
+# The two edges (easy < first <= medium < second <= hard) used until the backfill has worked out the real ones,
+# these are the thirds of the quotes in quotes.json (with two revealed letters, like the daily puzzle)
+DEFAULT_EDGES = (69.4, 73.1)
+
+# How long a sentence has to be before its length stops making it easier
+LONG_SENTENCE = 120
+
+
+def puzzleDifficulty(sentence, revealedLetters=()):
+    letters = [c for c in (sentence or "").lower() if c.isalpha()]
+    if not letters:
+        return 0.0
+
+    counts = Counter(letters)
+    total = len(letters)
+    entropy = -sum(n / total * math.log2(n / total) for n in counts.values())
+    revealed = sum(counts[letter.lower()] for letter in set(revealedLetters or []) if letter.lower() in counts) / total
+
+    score = (
+        0.35 * min(len(counts), 26) / 26 +
+        0.25 * entropy / math.log2(26) +
+        0.20 * (1 - min(total, LONG_SENTENCE) / LONG_SENTENCE) +
+        0.20 * (1 - revealed)
+    )
+    return round(100 * score, 1)
+
+
+def documentDifficulty(doc):
+    return puzzleDifficulty(doc.get("sentence"), doc.get("revealedLetters"))
+
+
+def checkBand(band):
+    if band and band not in DIFFICULTY_BANDS:
+        raise ValueError(f"Unknown difficulty '{band}', use one of: {', '.join(DIFFICULTY_BANDS)}")
+
+
+# The Mongo filter for a band, None when no band was asked for, ValueError when the band does not exist
+def difficultyFilter(band, edges=DEFAULT_EDGES):
+    checkBand(band)
+    if not band:
+        return None
+    first, second = edges
+    return {
+        "easy": {"difficulty": {"$lt": first}},
+        "medium": {"difficulty": {"$gte": first, "$lt": second}},
+        "hard": {"difficulty": {"$gte": second}},
+    }[band]
+
+
+def bandOf(difficulty, edges=DEFAULT_EDGES):
+    if difficulty is None:
+        return None
+    first, second = edges
+    return "easy" if difficulty < first else "medium" if difficulty < second else "hard"
+
+
+# The edges that split a list of scores in thirds, DEFAULT_EDGES when there are too few to tell
+def thirds(scores):
+    scores = sorted(s for s in scores if s is not None)
+    if len(scores) < 3:
+        return DEFAULT_EDGES
+    return (scores[len(scores) // 3], scores[2 * len(scores) // 3])
+
+
+# Works out the thirds of a collection with two lookups on the difficulty index, and saves them
+def updateBandEdges(collection):
+    count = collection.count_documents({"difficulty": {"$type": "number"}})
+    if count < 3:
+        return DEFAULT_EDGES
+    edges = []
+    for skip in (count // 3, 2 * count // 3):
+        doc = next(collection.find({"difficulty": {"$type": "number"}}, {"_id": 0, "difficulty": 1})
+                   .sort("difficulty", ASCENDING).skip(skip).limit(1))
+        edges.append(doc["difficulty"])
+    collection.database.difficulty_bands.replace_one(
+        {"_id": collection.name},
+        {"_id": collection.name, "edges": edges, "count": count, "updated": datetime.utcnow()},
+        upsert=True
+    )
+    return tuple(edges)
+
+
+# The saved edges of a collection, DEFAULT_EDGES before the backfill has run
+def bandEdges(collection):
+    saved = collection.database.difficulty_bands.find_one({"_id": collection.name})
+    return tuple(saved["edges"]) if saved else DEFAULT_EDGES
+
+
+# Scores the puzzles in a collection that have no difficulty yet, returns how many were scored
+def backfillDifficulty(collection, batch_size=1000):
+    updates = []
+    scored = 0
+    for doc in collection.find({"difficulty": {"$exists": False}}, {"sentence": 1, "revealedLetters": 1}):
+        updates.append(UpdateOne({"_id": doc["_id"]}, {"$set": {"difficulty": documentDifficulty(doc)}}))
+        if len(updates) >= batch_size:
+            scored += collection.bulk_write(updates, ordered=False).modified_count
+            updates = []
+    if updates:
+        scored += collection.bulk_write(updates, ordered=False).modified_count
+    return scored
+
+
+# Scheduled job - scores the puzzles added since last time in every puzzle collection, and splits them in thirds again
+def backfillAll(db, collections):
+    for name in collections:
+        scored = backfillDifficulty(db[name])
+        if scored:
+            print(f"[DIFFICULTY] scored {scored} puzzles in {name}")
+        if name != "daily_sentence":
+            updateBandEdges(db[name])
+
+
+if __name__ == "__main__":
+    import os
+    import pymongo
+    from dotenv import load_dotenv
+    from puzzle_import import PUZZLE_COLLECTIONS
+
+    load_dotenv()
+    client = pymongo.MongoClient(os.getenv("MONGO_URI"))
+    db = client["crackthecode"]
+    backfillAll(db, PUZZLE_COLLECTIONS + ["daily_sentence"])
+    print("Every puzzle has a difficulty now.")
@@ -0,0 +1,140 @@
+## Friend Graph - friendships and friend requests as edges in the friendships collection.
+## Every relation is saved as two documents, one from each side: {user, other, status, since}
+## where status is "friend", "sent" (user asked other) or "received" (other asked user).
+## The unique index on (user, other) and the index on (user, status, other) keep every lookup, page and count
+## an index read, no matter how many friends a player has. Every change is one bulk_write, except sending
+## a request, which lets the unique index decide who was first (see sendRequest).
+
+from datetime import datetime
+from pymongo import DeleteOne, ReturnDocument, UpdateOne
+from pymongo.errors import DuplicateKeyError
+
+FRIEND = "friend"
+SENT = "sent"
+RECEIVED = "received"
+
+DEFAULT_PAGE = 50
+MAX_PAGE = 200
+
+
+class FriendshipError(Exception):
+    pass
+
+
+# The status between two players seen from the first one, or None when there is nothing between them
+def relation(db, player, other):
+    edge = db.friendships.find_one({"user": player, "other": other}, {"_id": 0, "status": 1})
+    return edge["status"] if edge else None
+
+
+# Makes both sides friends, for two requests that crossed each other
+def makeFriends(db, player, other):
+    now = datetime.utcnow()
+    db.friendships.bulk_write([
+        UpdateOne({"user": player, "other": other}, {"$set": {"status": FRIEND, "since": now}}, upsert=True),
+        UpdateOne({"user": other, "other": player}, {"$set": {"status": FRIEND, "since": now}}, upsert=True),
+    ], ordered=False)
+
+
+# Sends a request, returns FRIEND instead of SENT when the other player had already asked (then it is accepted)
+# The unique index on (user, other) decides every race, so two players asking each other at the
+# same moment end up as friends instead of two "sent" edges that nobody can accept
+def sendRequest(db, player, other):
+    now = datetime.utcnow()
+    try:
+        db.friendships.insert_one({"user": player, "other": other, "status": SENT, "since": now})
+    except DuplicateKeyError:
+        status = relation(db, player, other)
+        if status == FRIEND:
+            raise FriendshipError("You are already friends")
+        if status == SENT:
+            raise FriendshipError("It send, they have not answered")
+        # RECEIVED: they asked first (maybe a moment ago), so this is a yes
+        makeFriends(db, player, other)
+        return FRIEND
+
+    # the other side, unless they have an edge already, which means their request crossed this one
+    theirs = db.friendships.find_one_and_update(
+        {"user": other, "other": player},
+        {"$setOnInsert": {"status": RECEIVED, "since": now}},
+        upsert=True,
+        projection={"_id": 0, "status": 1},
+        return_document=ReturnDocument.BEFORE
+    )
+    if theirs is not None:
+        makeFriends(db, player, other)
+        return FRIEND
+    return SENT
+
+
+# The player accepts the request the other player sent, returns False if there was no such request
+def acceptRequest(db, player, other):
+    now = datetime.utcnow()
+    result = db.friendships.bulk_write([
+        UpdateOne({"user": player, "other": other, "status": RECEIVED}, {"$set": {"status": FRIEND, "since": now}}),
+        UpdateOne({"user": other, "other": player, "status": SENT}, {"$set": {"status": FRIEND, "since": now}}),
+    ], ordered=False)
+    return result.matched_count > 0
+
+
+def denyRequest(db, player, other):
+    db.friendships.bulk_write([
+        DeleteOne({"user": player, "other": other, "status": RECEIVED}),
+        DeleteOne({"user": other, "other": player, "status": SENT}),
+    ], ordered=False)
+
+
+def removeFriend(db, player, other):
+    db.friendships.bulk_write([
+        DeleteOne({"user": player, "other": other, "status": FRIEND}),
+        DeleteOne({"user": other, "other": player, "status": FRIEND}),
+    ], ordered=False)
+
+
+def pageSize(limit):
+    try:
+        return max(1, min(int(limit), MAX_PAGE))
+    except (TypeError, ValueError):
+        return DEFAULT_PAGE
+
+
+# One page of names with the given status, sorted by name
+# Returns the names and the cursor (last name) for the next page, or None when it was the last page
+def listNames(db, player, status, after=None, limit=DEFAULT_PAGE):
+    limit = pageSize(limit)
+    query = {"user": player, "status": status}
+    if after:
+        query["other"] = {"$gt": after}
+    names = [e["other"] for e in db.friendships.find(query, {"_id": 0, "other": 1}).sort("other", 1).limit(limit + 1)]
+    nextCursor = names[limit - 1] if len(names) > limit else None
+    return names[:limit], nextCursor
+
+
+# Every friend name of a player, for places that need the whole list (like the friends leaderboard)
+def allFriends(db, player):
+    return [e["other"] for e in db.friendships.find({"user": player, "status": FRIEND}, {"_id": 0, "other": 1})]
+
+
+def friendCount(db, player):
+    return db.friendships.count_documents({"user": player, "status": FRIEND})
+
+
+# Friends the two players have in common, every friend of the first is checked against the index of the second
+def mutualFriends(db, player, other, limit=DEFAULT_PAGE):
+    return [doc["other"] for doc in db.friendships.aggregate([
+        {"$match": {"user": player, "status": FRIEND}},
+        {"$lookup": {
+            "from": "friendships",
+            "let": {"name": "$other"},
+            "pipeline": [
+                {"$match": {"user": other, "status": FRIEND, "$expr": {"$eq": ["$other", "$$name"]}}},
+                {"$limit": 1},
+                {"$project": {"_id": 1}}
+            ],
+            "as": "shared"
+        }},
+        {"$match": {"shared": {"$ne": []}}},
+        {"$sort": {"other": 1}},
+        {"$limit": pageSize(limit)},
+        {"$project": {"_id": 0, "other": 1}}
+    ])]
@@ -0,0 +1,56 @@
+## Group Members - group membership as one document per member in the group_members collection: {group, username, joined}.
+## The unique index on (group, username) makes "is this player in the group" one index lookup, even for huge groups,
+## and the index on (username, group) finds the groups of a player. Every group keeps a memberCount that is kept in step.
+
+from datetime import datetime
+from pymongo.errors import DuplicateKeyError
+
+DEFAULT_PAGE = 50
+MAX_PAGE = 200
+
+
+def isMember(db, group, username):
+    return db.group_members.find_one({"group": group, "username": username}, {"_id": 1}) is not None
+
+
+# Adds the player to the group, returns False if they were already in it
+def addMember(db, group, username):
+    try:
+        db.group_members.insert_one({"group": group, "username": username, "joined": datetime.utcnow()})
+    except DuplicateKeyError:
+        return False
+    db.groups.update_one({"name": group}, {"$inc": {"memberCount": 1}})
+    return True
+
+
+# Removes the player from the group, returns False if they were not in it
+def removeMember(db, group, username):
+    if not db.group_members.delete_one({"group": group, "username": username}).deleted_count:
+        return False
+    db.groups.update_one({"name": group}, {"$inc": {"memberCount": -1}})
+    return True
+
+
+# The names of every group the player is in
+def groupsOf(db, username):
+    return [m["group"] for m in db.group_members.find({"username": username}, {"_id": 0, "group": 1}).sort("group", 1)]
+
+
+# Every member name of a group, for places that need the whole list (like the group leaderboard)
+def allMembers(db, group):
+    return [m["username"] for m in db.group_members.find({"group": group}, {"_id": 0, "username": 1})]
+
+
+# One page of member names sorted by name, and the cursor for the next page (None on the last page)
+def listMembers(db, group, after=None, limit=DEFAULT_PAGE):
+    try:
+        limit = max(1, min(int(limit), MAX_PAGE))
+    except (TypeError, ValueError):
+        limit = DEFAULT_PAGE
+
+    query = {"group": group}
+    if after:
+        query["username"] = {"$gt": after}
+    names = [m["username"] for m in db.group_members.find(query, {"_id": 0, "username": 1}).sort("username", 1).limit(limit + 1)]
+    nextCursor = names[limit - 1] if len(names) > limit else None
+    return names[:limit], nextCursor
@@ -0,0 +1,51 @@
+## Gunicorn settings for running the backend on every core: gunicorn -c gunicorn.conf.py wsgi:app
+## Every worker is its own process with its own scheduler, the job leases in MongoDB make sure
+## each scheduled job still only runs once (see job_locks.py). The migrations are run once, in the master
+## process before any worker starts (on_starting below).
+## The values can be changed with environment variables without touching this file.
+
+import multiprocessing
+import os
+
+bind = os.getenv("BIND", "0.0.0.0:5000")
+
+# one worker per core plus one, each with a few threads for the bcrypt waits
+# the long open chat streams are served by gunicorn.stream.conf.py, so they don't take these threads
+workers = int(os.getenv("WEB_WORKERS", multiprocessing.cpu_count() + 1))
+# with more than one worker a chat message can be posted through another process than the stream is on,
+# without the change stream relay the streams check MongoDB for those every 30 seconds (see app.py)
+if workers > 1:
+    os.environ.setdefault("CHAT_POLL_SECONDS", "30")
+worker_class = "gthread"
+threads = int(os.getenv("WEB_THREADS", "16"))
+
+# the chat streams stay open, so the timeout has to be longer than the 15 second keepalive
+timeout = int(os.getenv("WEB_TIMEOUT", "60"))
+graceful_timeout = 30
+keepalive = 5
+
+# every worker imports the app itself, so the MongoDB client and the scheduler are made after the fork
+preload_app = False
+
+# Runs the migrations in the master process, with its own client so no connection is shared with the workers
+def on_starting(server):
+    import pymongo
+    from dotenv import load_dotenv
+    from migrations import runMigrations
+
+    load_dotenv()
+    client = pymongo.MongoClient(os.getenv("MONGO_URI"))
+    try:
+        runMigrations(client.get_default_database("crackthecode"))
+    except Exception as e:
+        # a RuntimeError stops gunicorn before any worker starts, see create_app in app.py for why
+        server.log.error(f"[MIGRATION] failed, not starting until it is fixed: {e}")
+        raise RuntimeError(f"Migration failed: {e}") from e
+    finally:
+        client.close()
+
+
+accesslog = "-"
+# the path without the query string (%(U)s instead of %(r)s), so the ?jwt= of the chat stream never ends up in the log
+access_log_format = '%(h)s %(l)s %(u)s %(t)s "%(m)s %(U)s %(H)s" %(s)s %(b)s "%(f)s" "%(a)s"'
+errorlog = "-"
@@ -0,0 +1,29 @@
+## Gunicorn settings for the chat streams only: gunicorn -c gunicorn.stream.conf.py wsgi:app
+## A /chat/.../stream connection stays open as long as the chat window does. With the thread workers in
+## gunicorn.conf.py every open chat holds a thread, so a few dozen chats would leave none for the other routes.
+## The gevent workers here hold thousands of open streams each, so the proxy sends /chat/<type>/<target>/stream
+## to this server and everything else to the one from gunicorn.conf.py (see the README).
+## New messages reach every process through the change stream relay in chat_hub.py.
+
+import os
+
+bind = os.getenv("STREAM_BIND", "0.0.0.0:5001")
+
+workers = int(os.getenv("STREAM_WORKERS", "2"))
+worker_class = "gevent"
+worker_connections = int(os.getenv("STREAM_CONNECTIONS", "2000"))
+# the messages are posted through the other server, without the change stream relay the streams
+# check MongoDB for them every 30 seconds (see app.py)
+os.environ.setdefault("CHAT_POLL_SECONDS", "30")
+
+# the streams send a keepalive at least every 15 seconds
+timeout = int(os.getenv("WEB_TIMEOUT", "60"))
+graceful_timeout = 30
+
+# the migrations are run by the main server (gunicorn.conf.py), so this one only imports the app
+preload_app = False
+
+accesslog = "-"
+# the path without the query string, the streams have the token in ?jwt=
+access_log_format = '%(h)s %(l)s %(u)s %(t)s "%(m)s %(U)s %(H)s" %(s)s %(b)s "%(f)s" "%(a)s"'
+errorlog = "-"
@@ -0,0 +1,83 @@
+## Job Locks - makes sure a scheduled job only runs in one process, even with many workers all running the scheduler.
+## Every job has a lease document in job_locks. A process takes the lease with one atomic update, and only
+## if nobody else holds it and the job has not run for this slot yet (the slot is the minute it was scheduled for).
+## Every run is written to job_runs with who ran it, how long it took and if it failed.
+
+from datetime import datetime, timedelta
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+import os
+import socket
+import time
+import traceback
+import uuid
+
+# Who this process is, saved on the lease so it can be seen who holds it
+OWNER = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+
+# Takes the lease for the job, returns True when this process may run it
+def acquireLease(db, job, slot, lease_seconds):
+    now = datetime.utcnow()
+    try:
+        taken = db.job_locks.find_one_and_update(
+            {
+                "_id": job,
+                "lastSlot": {"$ne": slot},
+                "$or": [{"leaseUntil": {"$lt": now}}, {"owner": OWNER}]
+            },
+            {"$set": {"owner": OWNER, "leaseUntil": now + timedelta(seconds=lease_seconds), "slot": slot}},
+            upsert=True,
+            return_document=ReturnDocument.AFTER
+        )
+    except DuplicateKeyError:
+        # the lease exists and somebody else has it (or the slot is done), so the upsert tried to make a second one
+        return False
+    return taken is not None
+
+
+def releaseLease(db, job, slot):
+    db.job_locks.update_one(
+        {"_id": job, "owner": OWNER},
+        {"$set": {"leaseUntil": datetime.utcnow(), "lastSlot": slot}}
+    )
+
+
+# Waits until this process holds the lease, for work that has to be done once before anything else (the migrations)
+# Every call has its own slot, so the lease is only ever busy, never "done"
+def holdLease(db, job, lease_seconds=3600, wait_seconds=3600):
+    slot = uuid.uuid4().hex
+    deadline = time.monotonic() + wait_seconds
+    while not acquireLease(db, job, slot, lease_seconds):
+        if time.monotonic() > deadline:
+            raise TimeoutError(f"{job} has been held by someone else for more than {wait_seconds} seconds")
+        time.sleep(1)
+    return slot
+
+
+# Runs the job if this process gets the lease, and saves the run in job_runs
+def runExclusive(db, job, func, lease_seconds=3600):
+    slot = datetime.utcnow().strftime('%Y-%m-%dT%H:%M')
+    if not acquireLease(db, job, slot, lease_seconds):
+        return False
+
+    started = datetime.utcnow()
+    timer = time.monotonic()
+    status, error = "ok", None
+    try:
+        func()
+    except Exception:
+        status, error = "failed", traceback.format_exc()
+        print(f"[JOB] {job} failed:\n{error}")
+    finally:
+        releaseLease(db, job, slot)
+        db.job_runs.insert_one({
+            "job": job,
+            "slot": slot,
+            "owner": OWNER,
+            "started": started,
+            "seconds": round(time.monotonic() - timer, 3),
+            "status": status,
+            "error": error
+        })
+    return True
@@ -0,0 +1,77 @@
+## JSON Provider - what jsonify (and app.json.dumps) uses to turn responses into JSON.
+## It uses orjson when it is installed, which is a lot faster than the json module on the big lists
+## (categories, highscores, chats), and falls back to the json module when it is not.
+## ObjectId becomes its hex string and datetime/date an ISO string, so raw Mongo documents can be sent as they are.
+## Every dumps is timed, and the time is reported per route on /metrics (see metrics.py).
+## JSON_BACKEND=stdlib forces the json module, so the two can be compared with benchmark.py.
+
+from datetime import date, datetime
+from bson import ObjectId
+from flask.json.provider import DefaultJSONProvider
+import json
+import os
+import time
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+# The types neither encoder knows about by itself
+def encodeExtra(obj):
+    if isinstance(obj, ObjectId):
+        return str(obj)
+    if isinstance(obj, (datetime, date)):
+        return obj.isoformat()
+    if isinstance(obj, (set, frozenset, tuple)):
+        return list(obj)
+    if isinstance(obj, bytes):
+        return obj.decode("utf-8", errors="replace")
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+class MongoJSONProvider(DefaultJSONProvider):
+    # set by init_app, called with the seconds every dumps took
+    timer = None
+
+    def __init__(self, app):
+        super().__init__(app)
+        self.backend = "orjson" if orjson is not None and os.getenv("JSON_BACKEND", "orjson") != "stdlib" else "stdlib"
+
+    def dumpsBytes(self, obj):
+        started = time.perf_counter()
+        try:
+            if self.backend == "orjson":
+                try:
+                    return orjson.dumps(obj, default=encodeExtra, option=orjson.OPT_NON_STR_KEYS)
+                except TypeError:
+                    # things orjson refuses but the json module takes, like ints above 64 bit
+                    pass
+            return json.dumps(obj, default=encodeExtra, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+        finally:
+            if self.timer:
+                self.timer(time.perf_counter() - started)
+
+    def dumps(self, obj, **kwargs):
+        if kwargs:
+            # someone wants indent, sort_keys or similar, only the json module has those
+            kwargs.setdefault("default", encodeExtra)
+            return json.dumps(obj, **kwargs)
+        return self.dumpsBytes(obj).decode("utf-8")
+
+    def loads(self, s, **kwargs):
+        if self.backend == "orjson" and not kwargs:
+            return orjson.loads(s)
+        return json.loads(s, **kwargs)
+
+    def response(self, *args, **kwargs):
+        return self._app.response_class(self.dumpsBytes(self._prepare_response_obj(args, kwargs)), mimetype=self.mimetype)
+
+
+# Makes it the apps JSON provider, timer gets the seconds of every dumps (for the per route metrics)
+def init_app(app, timer=None):
+    app.json_provider_class = MongoJSONProvider
+    app.json = MongoJSONProvider(app)
+    app.json.timer = timer
+    return app.json
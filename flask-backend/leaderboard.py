@@ -0,0 +1,112 @@
+## Leaderboard - keeps one "best score" document per player in the leaderboard collection.
+## submitScore updates it straight away, so /get-highscores is one indexed read instead of grouping every score ever sent.
+## The top list is also kept in memory for a short while and thrown away when a player beats their best.
+## The same table is used for the friends and group leaderboards, and for the rank of a single player.
+## Run this file directly to rebuild the leaderboard from the scores collection: python leaderboard.py
+
+from threading import Lock
+import time
+
+TOP_SIZE = 250
+
+
+class Leaderboard:
+    def __init__(self, db, cache_seconds=30):
+        self.db = db
+        self.cache_seconds = cache_seconds
+
+        self.snapshot = None    # cached top list, None when it has to be read again
+        self.snapshot_time = 0
+        self.ready = False      # old scores copied over
+        self.lock = Lock()
+
+    # Fills the leaderboard from old scores the first time it is used (the indexes are made in migrations.py)
+    def setup(self):
+        if self.ready:
+            return
+        with self.lock:
+            if self.ready:
+                return
+            if not self.db.leaderboard.find_one({}, {"_id": 1}) and self.db.scores.find_one({}, {"_id": 1}):
+                rebuildLeaderboard(self.db)
+            self.ready = True
+
+    # Saves the score if it is the best one for the player, returns True if it was
+    # One round trip: the pipeline only swaps score and timestamp when the new score is higher
+    # score and timestamp come from the player, so they go in as $literal and a "$..." string is never read as a field
+    def record(self, username, score, timestamp):
+        self.setup()
+        before = self.db.leaderboard.find_one_and_update(
+            {"username": username},
+            [{"$set": {
+                "timestamp": {"$cond": [{"$gt": [{"$literal": score}, "$score"]}, {"$literal": timestamp}, "$timestamp"]},
+                "score": {"$max": ["$score", {"$literal": score}]}
+            }}],
+            upsert=True,
+            projection={"_id": 0, "score": 1}
+        )
+
+        improved = before is None or before.get("score") is None or score > before["score"]
+        if improved:
+            self.invalidate()
+        return improved
+
+    # The top list, read from the cache if it is still fresh
+    def top(self, limit=TOP_SIZE):
+        self.setup()
+        now = time.monotonic()
+        snapshot = self.snapshot
+        if snapshot is None or now - self.snapshot_time >= self.cache_seconds:
+            snapshot = list(self.db.leaderboard.find(
+                {}, {"_id": 0, "username": 1, "score": 1, "timestamp": 1}
+            ).sort([("score", -1), ("username", 1)]).limit(TOP_SIZE))
+            self.snapshot = snapshot
+            self.snapshot_time = now
+        return snapshot[:limit]
+
+    def invalidate(self):
+        self.snapshot = None
+
+    # The best scores of only the given players (a friends list or a group), sorted like the top list
+    def scoped(self, usernames, limit=TOP_SIZE):
+        self.setup()
+        return list(self.db.leaderboard.find(
+            {"username": {"$in": list(usernames)}}, {"_id": 0, "username": 1, "score": 1, "timestamp": 1}
+        ).sort([("score", -1), ("username", 1)]).limit(limit))
+
+    # The place of the player on the global list (1 is the best), or None if they have no score yet
+    # Counting the players above on the score index means nothing has to be sorted
+    def rankOf(self, username):
+        self.setup()
+        best = self.db.leaderboard.find_one({"username": username}, {"_id": 0, "score": 1})
+        if not best:
+            return None
+        return self.db.leaderboard.count_documents({"score": {"$gt": best["score"]}}) + 1
+
+
+# Builds the leaderboard collection again from every score, keeping the timestamp of the best run
+def rebuildLeaderboard(db):
+    db.scores.aggregate([
+        {"$sort": {"username": 1, "score": -1}},
+        {"$group": {
+            "_id": "$username",
+            "score": {"$first": "$score"},
+            "timestamp": {"$first": "$timestamp"}
+        }},
+        {"$project": {"_id": 0, "username": "$_id", "score": 1, "timestamp": 1}},
+        {"$merge": {"into": "leaderboard", "on": "username", "whenMatched": "replace", "whenNotMatched": "insert"}}
+    ], allowDiskUse=True)
+
+
+if __name__ == "__main__":
+    import os
+    import pymongo
+    from dotenv import load_dotenv
+
+    load_dotenv()
+    client = pymongo.MongoClient(os.getenv("MONGO_URI"))
+    db = client["crackthecode"]
+
+    db.leaderboard.create_index("username", unique=True)
+    rebuildLeaderboard(db)
+    print(f"Leaderboard rebuilt with {db.leaderboard.count_documents({})} players.")
@@ -0,0 +1,245 @@
+## Metrics - latency, status codes and payload sizes per Flask endpoint, and the MongoDB commands each endpoint runs.
+## The request hooks time every request, and the pymongo CommandListener counts every command against the
+## endpoint of the request that sent it (pymongo calls it on the same thread), so N+1 query patterns show up.
+## json_provider.py reports how long every response took to serialize, also per endpoint.
+## Everything is served as Prometheus text on /metrics.
+## Every worker process has its own counters, so with gunicorn a scrape would only see the worker that answered it.
+## That is why every worker saves a snapshot of its counters in metrics_snapshots every 15 seconds, and /metrics adds up
+## the snapshots of all the workers that are alive (/metrics?scope=worker shows only the worker that answers). With SLOW_REQUEST_MS set, slow requests are printed
+## together with the Mongo commands they ran.
+
+from datetime import datetime, timedelta
+from pymongo import monitoring
+from threading import Lock, Thread, local
+import os
+import socket
+import time
+
+# Upper bounds (seconds) of the latency histogram buckets
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# What the request on this thread is, so the command listener knows who to blame
+current = local()
+
+
+class Metrics:
+    def __init__(self, slow_ms=0):
+        self.slow_ms = slow_ms
+        self.requests = {}   # endpoint -> {"buckets": [...], "sum", "count", "bytes", "statuses": {code: n}}
+        self.commands = {}   # (endpoint, command) -> {"count", "seconds", "failed"}
+        self.serialization = {}  # endpoint -> {"count", "seconds"}
+        self.collectors = [] # functions that return extra (name, labels, value) samples, like cache stats
+        self.lock = Lock()
+        self.publishing = False
+
+    ## Request hooks
+
+    def init_app(self, app):
+        app.before_request(self.startRequest)
+        app.after_request(self.finishRequest)
+
+    def startRequest(self):
+        from flask import request
+        current.endpoint = request.endpoint or "unknown"
+        current.started = time.perf_counter()
+        current.calls = []
+
+    def finishRequest(self, response):
+        started = getattr(current, "started", None)
+        if started is None:
+            return response
+        seconds = time.perf_counter() - started
+        endpoint = current.endpoint
+        size = response.content_length or 0  # streamed responses have no length and count as 0
+
+        with self.lock:
+            r = self.requests.setdefault(endpoint, {
+                "buckets": [0] * len(BUCKETS), "sum": 0.0, "count": 0, "bytes": 0, "statuses": {}
+            })
+            for i, bound in enumerate(BUCKETS):
+                if seconds <= bound:
+                    r["buckets"][i] += 1
+            r["sum"] += seconds
+            r["count"] += 1
+            r["bytes"] += size
+            r["statuses"][response.status_code] = r["statuses"].get(response.status_code, 0) + 1
+
+        if self.slow_ms and seconds * 1000 >= self.slow_ms:
+            calls = ", ".join(f"{name} {ms:.1f}ms" for name, ms in current.calls) or "no mongo calls"
+            print(f"[SLOW REQUEST] {endpoint} took {seconds * 1000:.1f}ms, {len(current.calls)} mongo calls: {calls}")
+
+        current.started = None
+        current.endpoint = None
+        return response
+
+    ## Mongo commands
+
+    def recordCommand(self, command, seconds, failed=False):
+        endpoint = getattr(current, "endpoint", None) or "background"
+        calls = getattr(current, "calls", None)
+        if calls is not None and getattr(current, "started", None) is not None:
+            calls.append((command, seconds * 1000))
+
+        with self.lock:
+            c = self.commands.setdefault((endpoint, command), {"count": 0, "seconds": 0.0, "failed": 0})
+            c["count"] += 1
+            c["seconds"] += seconds
+            if failed:
+                c["failed"] += 1
+
+    def commandListener(self):
+        return MongoCommandListener(self)
+
+    ## JSON serialization
+
+    def recordSerialization(self, seconds):
+        endpoint = getattr(current, "endpoint", None) or "background"
+        with self.lock:
+            s = self.serialization.setdefault(endpoint, {"count": 0, "seconds": 0.0})
+            s["count"] += 1
+            s["seconds"] += seconds
+
+    def serializationStats(self):
+        with self.lock:
+            return {endpoint: dict(s) for endpoint, s in self.serialization.items()}
+
+    ## Output
+
+    def addCollector(self, collect):
+        self.collectors.append(collect)
+
+    # Everything this worker has counted, in a form that can be saved in MongoDB
+    def snapshot(self):
+        worker = f"{socket.gethostname()}:{os.getpid()}"
+        with self.lock:
+            data = {
+                "requests": {e: dict(r, buckets=list(r["buckets"]), statuses={str(k): v for k, v in r["statuses"].items()})
+                             for e, r in self.requests.items()},
+                "commands": [dict(c, endpoint=e, command=name) for (e, name), c in self.commands.items()],
+                "serialization": {e: dict(s) for e, s in self.serialization.items()},
+            }
+        # the collector values (cache sizes, pool sizes) are per worker, so they keep a worker label
+        data["samples"] = [
+            [name, dict(labels, worker=worker), value]
+            for collect in self.collectors for name, labels, value in collect()
+        ]
+        return worker, data
+
+    # Saves the snapshot of this worker every interval seconds, in a background thread
+    def startPublishing(self, db, interval=15):
+        if self.publishing:
+            return
+        self.publishing = True
+
+        def publish():
+            while True:
+                try:
+                    worker, data = self.snapshot()
+                    db.metrics_snapshots.replace_one(
+                        {"_id": worker}, {"_id": worker, "updated": datetime.utcnow(), "data": data}, upsert=True
+                    )
+                except Exception as e:
+                    print(f"[METRICS] could not save the snapshot: {e}")
+                time.sleep(interval)
+
+        Thread(target=publish, daemon=True, name="metrics-publisher").start()
+
+    # All the workers added up, from the snapshots saved in the last max_age seconds (this worker's is taken fresh)
+    def renderAll(self, db, max_age=60):
+        worker, own = self.snapshot()
+        snapshots = [own] + [
+            s["data"] for s in db.metrics_snapshots.find({
+                "_id": {"$ne": worker}, "updated": {"$gte": datetime.utcnow() - timedelta(seconds=max_age)}
+            })
+        ]
+        return self.renderSnapshot(mergeSnapshots(snapshots))
+
+    def render(self):
+        return self.renderSnapshot(self.snapshot()[1])
+
+    def renderSnapshot(self, data):
+        requests = data["requests"]
+        commands = {(c["endpoint"], c["command"]): c for c in data["commands"]}
+        serialization = data["serialization"]
+        lines = []
+        lines.append("# TYPE http_request_duration_seconds histogram")
+        for endpoint, r in sorted(requests.items()):
+            for bound, count in zip(BUCKETS, r["buckets"]):
+                lines.append(f'http_request_duration_seconds_bucket{{endpoint="{endpoint}",le="{bound}"}} {count}')
+            lines.append(f'http_request_duration_seconds_bucket{{endpoint="{endpoint}",le="+Inf"}} {r["count"]}')
+            lines.append(f'http_request_duration_seconds_sum{{endpoint="{endpoint}"}} {r["sum"]:.6f}')
+            lines.append(f'http_request_duration_seconds_count{{endpoint="{endpoint}"}} {r["count"]}')
+
+        lines.append("# TYPE http_requests_total counter")
+        for endpoint, r in sorted(requests.items()):
+            for status, count in sorted(r["statuses"].items()):
+                lines.append(f'http_requests_total{{endpoint="{endpoint}",status="{status}"}} {count}')
+
+        lines.append("# TYPE http_response_bytes_total counter")
+        for endpoint, r in sorted(requests.items()):
+            lines.append(f'http_response_bytes_total{{endpoint="{endpoint}"}} {r["bytes"]}')
+
+        lines.append("# TYPE mongo_commands_total counter")
+        for (endpoint, command), c in sorted(commands.items()):
+            lines.append(f'mongo_commands_total{{endpoint="{endpoint}",command="{command}"}} {c["count"]}')
+        lines.append("# TYPE mongo_command_duration_seconds_total counter")
+        for (endpoint, command), c in sorted(commands.items()):
+            lines.append(f'mongo_command_duration_seconds_total{{endpoint="{endpoint}",command="{command}"}} {c["seconds"]:.6f}')
+        lines.append("# TYPE mongo_command_failures_total counter")
+        for (endpoint, command), c in sorted(commands.items()):
+            lines.append(f'mongo_command_failures_total{{endpoint="{endpoint}",command="{command}"}} {c["failed"]}')
+
+        lines.append("# TYPE json_serializations_total counter")
+        for endpoint, s in sorted(serialization.items()):
+            lines.append(f'json_serializations_total{{endpoint="{endpoint}"}} {s["count"]}')
+        lines.append("# TYPE json_serialization_seconds_total counter")
+        for endpoint, s in sorted(serialization.items()):
+            lines.append(f'json_serialization_seconds_total{{endpoint="{endpoint}"}} {s["seconds"]:.6f}')
+
+        for name, labels, value in data["samples"]:
+            labelText = ",".join(f'{k}="{v}"' for k, v in sorted(labels.items()))
+            lines.append(f"{name}{{{labelText}}} {value}" if labelText else f"{name} {value}")
+
+        return "\n".join(lines) + "\n"
+
+
+# Adds up the snapshots of several workers into one
+def mergeSnapshots(snapshots):
+    merged = {"requests": {}, "commands": {}, "serialization": {}, "samples": []}
+    for data in snapshots:
+        for endpoint, r in data["requests"].items():
+            m = merged["requests"].setdefault(endpoint, {
+                "buckets": [0] * len(BUCKETS), "sum": 0.0, "count": 0, "bytes": 0, "statuses": {}
+            })
+            m["buckets"] = [a + b for a, b in zip(m["buckets"], r["buckets"])]
+            for key in ("sum", "count", "bytes"):
+                m[key] += r[key]
+            for status, count in r["statuses"].items():
+                m["statuses"][status] = m["statuses"].get(status, 0) + count
+        for c in data["commands"]:
+            m = merged["commands"].setdefault((c["endpoint"], c["command"]), {
+                "endpoint": c["endpoint"], "command": c["command"], "count": 0, "seconds": 0.0, "failed": 0
+            })
+            for key in ("count", "seconds", "failed"):
+                m[key] += c[key]
+        for endpoint, s in data["serialization"].items():
+            m = merged["serialization"].setdefault(endpoint, {"count": 0, "seconds": 0.0})
+            m["count"] += s["count"]
+            m["seconds"] += s["seconds"]
+        merged["samples"] += data["samples"]
+    merged["commands"] = list(merged["commands"].values())
+    return merged
+
+
+class MongoCommandListener(monitoring.CommandListener):
+    def __init__(self, metrics):
+        self.metrics = metrics
+
+    def started(self, event):
+        pass
+
+    def succeeded(self, event):
+        self.metrics.recordCommand(event.command_name, event.duration_micros / 1e6)
+
+    def failed(self, event):
+        self.metrics.recordCommand(event.command_name, event.duration_micros / 1e6, failed=True)
@@ -0,0 +1,297 @@
+## Migrations - creates the indexes the backend needs and keeps track of which steps have been run.
+## Every step has a version number and is only run once, the done ones are saved in the migrations collection.
+## app.py runs this on startup, but it can also be run by hand:
+## python migrations.py            (runs the steps that are missing)
+## python migrations.py --explain  (checks the queries in app.py for collection scans)
+
+from datetime import datetime
+from pymongo import ASCENDING, DESCENDING, UpdateOne
+from pymongo.errors import DuplicateKeyError
+
+from difficulty import backfillDifficulty, updateBandEdges
+from job_locks import holdLease, releaseLease
+from player_stats import rebuildStats
+from puzzle_import import PUZZLE_COLLECTIONS, sentenceHash
+from search import searchKey
+
+
+# Removes duplicates of the given key, so a unique index can be made (the oldest document is kept)
+def removeDuplicates(collection, fields):
+    groups = collection.aggregate([
+        {"$sort": {"_id": 1}},
+        {"$group": {"_id": {f: f"${f}" for f in fields}, "ids": {"$push": "$_id"}, "count": {"$sum": 1}}},
+        {"$match": {"count": {"$gt": 1}}}
+    ], allowDiskUse=True)
+
+    removed = 0
+    for group in groups:
+        removed += collection.delete_many({"_id": {"$in": group["ids"][1:]}}).deleted_count
+    if removed:
+        print(f"[MIGRATION] removed {removed} duplicate documents from {collection.name}")
+
+
+# Players and groups with the same name can't just be deleted like the scores (they have friends, members and chats),
+# so they are named in the error and have to be renamed or merged by hand before the unique index can be made
+def checkNoDuplicates(collection, field):
+    duplicates = [group["_id"] for group in collection.aggregate([
+        {"$group": {"_id": f"${field}", "count": {"$sum": 1}}},
+        {"$match": {"count": {"$gt": 1}}},
+        {"$limit": 20}
+    ], allowDiskUse=True)]
+    if duplicates:
+        raise RuntimeError(f"{collection.name} has more than one document with the {field} {', '.join(map(str, duplicates))}")
+
+
+# Step 1 - the indexes for all the lookups in app.py
+# The unique ones make the duplicate checks in signup, submitScore, completingDailyPuzzle and createingGroup race-free
+def createBaseIndexes(db):
+    removeDuplicates(db.scores, ["username", "sessionId"])
+    removeDuplicates(db.daily_attempts, ["username", "date"])
+    removeDuplicates(db.daily_sentence, ["date"])
+    checkNoDuplicates(db.players, "username")
+    checkNoDuplicates(db.groups, "name")
+
+    db.players.create_index("username", unique=True)
+    db.scores.create_index([("username", ASCENDING), ("sessionId", ASCENDING)], unique=True)
+    db.scores.create_index([("username", ASCENDING), ("score", DESCENDING)])
+    db.daily_attempts.create_index([("username", ASCENDING), ("date", ASCENDING)], unique=True)
+    db.daily_attempts.create_index("date")
+    db.daily_sentence.create_index("date", unique=True)
+    db.groups.create_index("name", unique=True)
+    db.groups.create_index("members")
+    db.friend_chats.create_index("participants")
+    db.group_chats.create_index("group")
+
+
+# Step 2 - the leaderboard collection from leaderboard.py
+def createLeaderboardIndexes(db):
+    removeDuplicates(db.leaderboard, ["username"])
+    db.leaderboard.create_index("username", unique=True)
+    db.leaderboard.create_index([("score", DESCENDING), ("username", ASCENDING)])
+
+
+# Step 3 - lets the nightly streak reset only look at players with a streak going
+def createStreakIndex(db):
+    db.players.create_index("streak.current")
+
+
+# Step 4 - the searchKey used by search.py, filled in for the players and groups that already exist
+def createSearchKeys(db):
+    for collection, field in ((db.players, "username"), (db.groups, "name")):
+        updates = [
+            UpdateOne({"_id": doc["_id"]}, {"$set": {"searchKey": searchKey(doc.get(field))}})
+            for doc in collection.find({"searchKey": {"$exists": False}}, {field: 1})
+        ]
+        for i in range(0, len(updates), 1000):
+            collection.bulk_write(updates[i:i + 1000], ordered=False)
+        collection.create_index("searchKey")
+
+
+# Step 5 - moves friends and friend requests out of the players arrays into the friendships collection
+def createFriendships(db):
+    db.friendships.create_index([("user", ASCENDING), ("other", ASCENDING)], unique=True)
+    db.friendships.create_index([("user", ASCENDING), ("status", ASCENDING), ("other", ASCENDING)])
+
+    now = datetime.utcnow()
+    edges = []
+    arrays = {"friends": 1, "sentRequests": 1, "friendRequests": 1}
+    hasArrays = {"$or": [{field: {"$exists": True}} for field in arrays]}
+    for player in db.players.find(hasArrays, dict(arrays, username=1)):
+        name = player["username"]
+        # friends win over requests, so they are added last with $set
+        for other in player.get("sentRequests", []):
+            edges.append(UpdateOne({"user": name, "other": other}, {"$setOnInsert": {"status": "sent", "since": now}}, upsert=True))
+        for other in player.get("friendRequests", []):
+            edges.append(UpdateOne({"user": name, "other": other}, {"$setOnInsert": {"status": "received", "since": now}}, upsert=True))
+        for other in player.get("friends", []):
+            for user, friend in ((name, other), (other, name)):
+                edges.append(UpdateOne({"user": user, "other": friend}, {"$set": {"status": "friend"}, "$setOnInsert": {"since": now}}, upsert=True))
+
+    for i in range(0, len(edges), 1000):
+        db.friendships.bulk_write(edges[i:i + 1000], ordered=True)
+
+    db.players.update_many(hasArrays, {"$unset": {field: "" for field in arrays}})
+
+
+# Step 6 - moves the groups members arrays into the group_members collection and counts them
+def createGroupMembers(db):
+    db.group_members.create_index([("group", ASCENDING), ("username", ASCENDING)], unique=True)
+    db.group_members.create_index([("username", ASCENDING), ("group", ASCENDING)])
+
+    now = datetime.utcnow()
+    for group in db.groups.find({"members": {"$exists": True}}, {"name": 1, "members": 1}):
+        members = list(dict.fromkeys(group.get("members", [])))
+        rows = [
+            UpdateOne({"group": group["name"], "username": name}, {"$setOnInsert": {"joined": now}}, upsert=True)
+            for name in members
+        ]
+        for i in range(0, len(rows), 1000):
+            db.group_members.bulk_write(rows[i:i + 1000], ordered=False)
+        count = db.group_members.count_documents({"group": group["name"]})
+        db.groups.update_one({"_id": group["_id"]}, {"$set": {"memberCount": count}, "$unset": {"members": ""}})
+
+    if "members_1" in db.groups.index_information():
+        db.groups.drop_index("members_1")
+
+
+# Step 7 - the index for paging through a players scores, and player_stats filled in from the scores so far
+def createPlayerStats(db):
+    db.scores.create_index([("username", ASCENDING), ("score", DESCENDING), ("_id", DESCENDING)])
+    db.player_stats.create_index("username", unique=True)
+    rebuildStats(db)
+
+
+# Step 8 - the sentenceHash puzzle_import.py uses to skip sentences that are already there, filled in for the old puzzles
+def createSentenceHashes(db):
+    for name in PUZZLE_COLLECTIONS:
+        collection = db[name]
+        updates = [
+            UpdateOne({"_id": doc["_id"]}, {"$set": {"sentenceHash": sentenceHash(doc.get("sentence"))}})
+            for doc in collection.find({"sentenceHash": {"$exists": False}}, {"sentence": 1})
+        ]
+        for i in range(0, len(updates), 1000):
+            collection.bulk_write(updates[i:i + 1000], ordered=False)
+        collection.create_index("sentenceHash")
+
+
+# Step 9 - the difficulty score from difficulty.py for every puzzle there is, and the index the difficulty bands use
+def createDifficulty(db):
+    for name in PUZZLE_COLLECTIONS + ["daily_sentence"]:
+        backfillDifficulty(db[name])
+    for name in PUZZLE_COLLECTIONS:
+        db[name].create_index("difficulty")
+
+
+# Step 10 - the difficulty bands are the thirds of each collection, worked out from the scores step 9 saved
+def createBandEdges(db):
+    for name in PUZZLE_COLLECTIONS:
+        updateBandEdges(db[name])
+
+
+# Step 11 - search pages on (searchKey, _id), so names with the same key are not skipped, see search.py
+def createSearchPagingIndexes(db):
+    for collection in (db.players, db.groups):
+        collection.create_index([("searchKey", ASCENDING), ("_id", ASCENDING)])
+        if "searchKey_1" in collection.index_information():
+            collection.drop_index("searchKey_1")
+
+
+# Step 12 - lets removeUnusedPicture check if another player still uses a picture, see profile_pictures.py
+def createPictureIndexes(db):
+    db.players.create_index("picture", sparse=True)
+    db.players.create_index("pictures.small", sparse=True)
+
+
+# All the steps in the order they are run, new ones are added at the bottom with the next number
+MIGRATIONS = [
+    (1, "base indexes", createBaseIndexes),
+    (2, "leaderboard indexes", createLeaderboardIndexes),
+    (3, "streak index", createStreakIndex),
+    (4, "search keys", createSearchKeys),
+    (5, "friendships collection", createFriendships),
+    (6, "group members collection", createGroupMembers),
+    (7, "player stats", createPlayerStats),
+    (8, "sentence hashes", createSentenceHashes),
+    (9, "puzzle difficulty", createDifficulty),
+    (10, "difficulty band edges", createBandEdges),
+    (11, "search paging indexes", createSearchPagingIndexes),
+    (12, "profile picture indexes", createPictureIndexes),
+]
+
+
+# Runs every step that has not been run before, returns the versions that were run now
+# The steps are not safe to run at the same time in two processes (the backfills would count twice),
+# so only the process holding the "migrations" lease runs them, the others wait and then find them done
+def runMigrations(db):
+    slot = holdLease(db, "migrations")
+    try:
+        return runMissingSteps(db)
+    finally:
+        releaseLease(db, "migrations", slot)
+
+
+def runMissingSteps(db):
+    done = {m["_id"] for m in db.migrations.find({}, {"_id": 1})}
+    ran = []
+
+    for version, name, step in MIGRATIONS:
+        if version in done:
+            continue
+        started = datetime.utcnow()
+        step(db)
+        try:
+            db.migrations.insert_one({
+                "_id": version,
+                "name": name,
+                "ranAt": started,
+                "seconds": (datetime.utcnow() - started).total_seconds()
+            })
+        except DuplicateKeyError:
+            # only if the lease ran out while the step was running and someone else ran it as well
+            print(f"[MIGRATION] {version} - {name} was also run by another process")
+            continue
+        print(f"[MIGRATION] {version} - {name} done")
+        ran.append(version)
+
+    return ran
+
+
+# The queries app.py runs most, used to check that none of them end up as a collection scan
+EXPLAIN_QUERIES = [
+    ("players", {"username": "someone"}),
+    ("scores", {"username": "someone", "sessionId": "abc"}),
+    ("daily_attempts", {"username": "someone", "date": "2025-01-01"}),
+    ("daily_sentence", {"date": "2025-01-01"}),
+    ("groups", {"name": "somegroup"}),
+    ("group_members", {"group": "somegroup", "username": "someone"}),
+    ("group_members", {"username": "someone"}),
+    ("friend_chats", {"participants": ["a", "b"]}),
+    ("group_chats", {"group": "somegroup"}),
+    ("leaderboard", {"username": "someone"}),
+    ("friendships", {"user": "someone", "status": "friend"}),
+    ("players", {"$or": [{"picture": "/static/uploads/a_256.webp"}, {"pictures.small": "/static/uploads/a_64.webp"}]}),
+    ("sentences", {"sentenceHash": {"$in": ["abc"]}}),
+    ("sentences", {"difficulty": {"$gte": 55, "$lt": 70}}),
+    ("Dota", {"difficulty": {"$gte": 55, "$lt": 70}}),
+]
+
+
+# Finds the stages in an explain plan, so COLLSCAN can be spotted anywhere in it
+def planStages(plan):
+    stages = [plan.get("stage")]
+    for key in ("inputStage", "queryPlan"):
+        if key in plan:
+            stages += planStages(plan[key])
+    for child in plan.get("inputStages", []):
+        stages += planStages(child)
+    return stages
+
+
+# Explains every query above and returns the ones that scan the whole collection
+def findCollectionScans(db):
+    scans = []
+    for collection, query in EXPLAIN_QUERIES:
+        explained = db.command("explain", {"find": collection, "filter": query}, verbosity="queryPlanner")
+        stages = planStages(explained["queryPlanner"]["winningPlan"])
+        if "COLLSCAN" in stages:
+            scans.append((collection, query))
+            print(f"[EXPLAIN] collection scan on {collection} for {query}")
+    return scans
+
+
+if __name__ == "__main__":
+    import os
+    import sys
+    import pymongo
+    from dotenv import load_dotenv
+
+    load_dotenv()
+    client = pymongo.MongoClient(os.getenv("MONGO_URI"))
+    db = client["crackthecode"]
+
+    ran = runMigrations(db)
+    print(f"Ran {len(ran)} migrations." if ran else "Everything is up to date.")
+
+    if "--explain" in sys.argv:
+        scans = findCollectionScans(db)
+        print(f"{len(scans)} queries use a collection scan." if scans else "No collection scans found.")
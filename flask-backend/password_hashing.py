@@ -0,0 +1,73 @@
+## Password Hashing - runs the bcrypt hashing for login, signup and groups in its own small pool of threads.
+## Only so many hashes can wait at once, when the pool is full the request gets a 503 straight away
+## instead of pinning every worker, so cheap routes like /get-puzzle keep working during a login burst.
+## The cost (rounds) comes from BCRYPT_ROUNDS, and old hashes with another cost are redone on login.
+
+from concurrent.futures import ThreadPoolExecutor, TimeoutError
+from threading import BoundedSemaphore, Lock
+import time
+
+
+class HashingBusy(Exception):
+    pass
+
+
+class HashingPool:
+    def __init__(self, bcrypt, rounds=12, workers=2, max_waiting=16, timeout=10):
+        self.bcrypt = bcrypt
+        self.rounds = rounds
+        self.timeout = timeout
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="bcrypt")
+        # one slot per running or waiting hash, when they are all taken new work is turned away
+        self.slots = BoundedSemaphore(workers + max_waiting)
+
+        self.timings = {}   # operation -> {"count", "seconds", "max", "rejected"}
+        self.lock = Lock()
+
+    def hash(self, password):
+        hashed = self._run("hash", self.bcrypt.generate_password_hash, password, self.rounds)
+        return hashed.decode('utf-8')
+
+    def check(self, hashed, password):
+        return self._run("check", self.bcrypt.check_password_hash, hashed, password)
+
+    # True when the hash was made with another cost than the one set now
+    def needsRehash(self, hashed):
+        try:
+            return int(hashed.split("$")[2]) != self.rounds
+        except (IndexError, ValueError, AttributeError):
+            return False
+
+    def stats(self):
+        with self.lock:
+            return {op: dict(t) for op, t in self.timings.items()}
+
+    def _run(self, operation, func, *args):
+        if not self.slots.acquire(blocking=False):
+            self._record(operation, rejected=True)
+            raise HashingBusy("Too many logins right now, try again in a moment")
+        started = time.monotonic()
+        try:
+            future = self.executor.submit(func, *args)
+        except Exception:
+            self.slots.release()
+            raise
+        # the slot is given back when the hash is really done, a timed out hash keeps running and keeps its slot
+        future.add_done_callback(lambda _: self.slots.release())
+        try:
+            result = future.result(timeout=self.timeout)
+        except TimeoutError:
+            self._record(operation, rejected=True)
+            raise HashingBusy("The server is busy, try again in a moment")
+        self._record(operation, seconds=time.monotonic() - started)
+        return result
+
+    def _record(self, operation, seconds=0.0, rejected=False):
+        with self.lock:
+            t = self.timings.setdefault(operation, {"count": 0, "seconds": 0.0, "max": 0.0, "rejected": 0})
+            if rejected:
+                t["rejected"] += 1
+            else:
+                t["count"] += 1
+                t["seconds"] += seconds
+                t["max"] = max(t["max"], seconds)
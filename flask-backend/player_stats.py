@@ -0,0 +1,126 @@
+## Player Stats - a summary of every endless run a player has submitted, kept in the player_stats collection.
+## submitScore updates it with $inc/$max (and $push/$slice for the last runs), so the scoreboard page
+## can show totals, best, mean, a histogram and the recent trend without downloading the whole history.
+## rebuildStats works the whole collection out again from the scores (the backfill in migrations.py).
+
+from pymongo import UpdateOne
+
+RECENT_RUNS = 10
+
+
+# The histogram bucket of a score, the buckets double in size: "0", "1", "2-3", "4-7", "8-15", ...
+def scoreBucket(score):
+    score = int(score)
+    if score <= 0:
+        return "0"
+    # bit_length and not log2, which rounds up just below a power of two (2**49 - 1 ended up in the 2**49 bucket)
+    low = 1 << (score.bit_length() - 1)
+    high = low * 2 - 1
+    return str(low) if low == high else f"{low}-{high}"
+
+
+# The update that adds one run to the stats, shared by submitScore and the backfill in migrations.py
+def runUpdate(score, timestamp):
+    return {
+        "$inc": {"runs": 1, "total": score, f"histogram.{scoreBucket(score)}": 1},
+        "$max": {"best": score},
+        "$push": {"recent": {"$each": [{"score": score, "timestamp": timestamp}], "$slice": -RECENT_RUNS}}
+    }
+
+
+def recordRun(db, username, score, timestamp):
+    db.player_stats.update_one({"username": username}, runUpdate(score, timestamp), upsert=True)
+
+
+# Many runs of one player in one bulk write, for /submit-scores, runs is a list of (score, timestamp)
+def recordRuns(db, username, runs):
+    if runs:
+        db.player_stats.bulk_write([
+            UpdateOne({"username": username}, runUpdate(score, timestamp), upsert=True)
+            for score, timestamp in runs
+        ], ordered=True)
+
+
+# scoreBucket as an aggregation expression, for rebuildStats
+# $log can be off by a tiny bit on exact powers of two, so the exponent is corrected by one either way
+def bucketExpression(score):
+    return {"$let": {
+        "vars": {"s": {"$trunc": score}},
+        "in": {"$cond": [{"$lte": ["$$s", 0]}, "0", {"$let": {
+            "vars": {"e": {"$floor": {"$log": ["$$s", 2]}}},
+            "in": {"$let": {
+                "vars": {"low": {"$toLong": {"$switch": {"branches": [
+                    {"case": {"$gt": [{"$pow": [2, "$$e"]}, "$$s"]}, "then": {"$pow": [2, {"$subtract": ["$$e", 1]}]}},
+                    {"case": {"$lte": [{"$pow": [2, {"$add": ["$$e", 1]}]}, "$$s"]}, "then": {"$pow": [2, {"$add": ["$$e", 1]}]}}
+                ], "default": {"$pow": [2, "$$e"]}}}}},
+                "in": {"$cond": [
+                    {"$eq": ["$$low", 1]}, "1",
+                    {"$concat": [{"$toString": "$$low"}, "-", {"$toString": {"$subtract": [{"$multiply": ["$$low", 2]}, 1]}}]}
+                ]}
+            }}
+        }}]}
+    }}
+
+
+# Works player_stats out again from all the scores with one aggregation, and replaces what is there
+# Running it twice gives the same result, unlike adding runUpdate for every old score (needs MongoDB 5.2+ for $lastN)
+def rebuildStats(db):
+    db.scores.aggregate([
+        {"$match": {"score": {"$type": "number"}}},
+        {"$sort": {"_id": 1}},
+        {"$group": {
+            "_id": {"username": "$username", "bucket": bucketExpression("$score")},
+            "runs": {"$sum": 1},
+            "total": {"$sum": "$score"},
+            "best": {"$max": "$score"},
+            "recent": {"$lastN": {"n": RECENT_RUNS, "input": {"id": "$_id", "score": "$score", "timestamp": "$timestamp"}}}
+        }},
+        {"$group": {
+            "_id": "$_id.username",
+            "runs": {"$sum": "$runs"},
+            "total": {"$sum": "$total"},
+            "best": {"$max": "$best"},
+            "histogram": {"$push": {"k": "$_id.bucket", "v": "$runs"}},
+            "recent": {"$push": "$recent"}
+        }},
+        {"$project": {
+            "_id": 0,
+            "username": "$_id",
+            "runs": 1,
+            "total": 1,
+            "best": 1,
+            "histogram": {"$arrayToObject": "$histogram"},
+            "recent": {"$map": {
+                "input": {"$lastN": {"n": RECENT_RUNS, "input": {"$sortArray": {
+                    "input": {"$reduce": {"input": "$recent", "initialValue": [], "in": {"$concatArrays": ["$$value", "$$this"]}}},
+                    "sortBy": {"id": 1}
+                }}}},
+                "as": "run",
+                "in": {"score": "$$run.score", "timestamp": "$$run.timestamp"}
+            }}
+        }},
+        {"$merge": {"into": "player_stats", "on": "username", "whenMatched": "replace", "whenNotMatched": "insert"}}
+    ], allowDiskUse=True)
+
+
+# The stats as the frontend gets them, with the mean and the trend worked out
+# trend is the mean of the recent runs minus the overall mean, so above 0 means the player is getting better
+def getStats(db, username):
+    stats = db.player_stats.find_one({"username": username}, {"_id": 0})
+    if not stats:
+        return {"username": username, "runs": 0, "best": None, "mean": None, "histogram": {}, "recent": [], "trend": None}
+
+    runs = stats.get("runs", 0)
+    mean = stats.get("total", 0) / runs if runs else None
+    recent = stats.get("recent", [])
+    recentMean = sum(r["score"] for r in recent) / len(recent) if recent else None
+
+    return {
+        "username": username,
+        "runs": runs,
+        "best": stats.get("best"),
+        "mean": round(mean, 2) if mean is not None else None,
+        "histogram": stats.get("histogram", {}),
+        "recent": recent,
+        "trend": round(recentMean - mean, 2) if mean is not None and recentMean is not None else None
+    }
@@ -0,0 +1,62 @@
+## Profile Cards - a cache of {username, picture} for the friend lists, requests and public profiles.
+## get_many only asks MongoDB for the names it does not have yet, in one $in query.
+## It holds at most max_size cards (the least recently used go first) and a card is thrown away
+## when the player changes their profile, or after ttl seconds in case another process changed it.
+
+from collections import OrderedDict
+from threading import Lock
+import time
+
+CARD_FIELDS = {"_id": 0, "username": 1, "picture": 1}
+
+
+class ProfileCardCache:
+    def __init__(self, collection, max_size=5000, ttl=300):
+        self.collection = collection
+        self.max_size = max_size
+        self.ttl = ttl
+        self.cards = OrderedDict()  # username -> (expires at, card)
+        self.hits = 0
+        self.misses = 0
+        self.lock = Lock()
+
+    # The cards for the names in the same order, players that do not exist are left out
+    def get_many(self, usernames):
+        now = time.monotonic()
+        found = {}
+        missing = []
+
+        with self.lock:
+            for name in usernames:
+                entry = self.cards.get(name)
+                if entry and entry[0] > now:
+                    self.cards.move_to_end(name)
+                    found[name] = entry[1]
+                elif name not in missing:
+                    missing.append(name)
+            self.hits += len(found)
+            self.misses += len(missing)
+
+        if missing:
+            loaded = list(self.collection.find({"username": {"$in": missing}}, CARD_FIELDS))
+            with self.lock:
+                for card in loaded:
+                    found[card["username"]] = card
+                    self.cards[card["username"]] = (now + self.ttl, card)
+                    self.cards.move_to_end(card["username"])
+                while len(self.cards) > self.max_size:
+                    self.cards.popitem(last=False)
+
+        return [dict(found[name]) for name in dict.fromkeys(usernames) if name in found]
+
+    def get(self, username):
+        cards = self.get_many([username])
+        return cards[0] if cards else None
+
+    def invalidate(self, username):
+        with self.lock:
+            self.cards.pop(username, None)
+
+    def stats(self):
+        with self.lock:
+            return {"hits": self.hits, "misses": self.misses, "size": len(self.cards)}
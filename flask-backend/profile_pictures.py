@@ -0,0 +1,99 @@
+## Profile Pictures - checks an uploaded image and turns it into small square WebP thumbnails.
+## The files are named after a hash of the picture, so the same upload is only saved once
+## and a file never changes, which lets the browser cache them for a year.
+## The decoding runs in a small worker pool, so big images can't take over all the request threads.
+
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+from PIL import Image, UnidentifiedImageError
+import hashlib
+import os
+import re
+import tempfile
+
+UPLOAD_FOLDER = os.path.join("static", "uploads")
+UPLOAD_URL = "/static/uploads/"
+
+# The thumbnails that are made, name -> width and height in pixels
+THUMBNAIL_SIZES = {"small": 64, "large": 256}
+ALLOWED_FORMATS = {"JPEG", "PNG", "GIF", "WEBP", "BMP"}
+MAX_PIXELS = 40_000_000
+
+# Matches the names made here, everything else in uploads is an old style upload
+HASHED_NAME = re.compile(r"^[0-9a-f]{32}_\d+\.webp$")
+
+imageWorkers = ThreadPoolExecutor(max_workers=2, thread_name_prefix="profile-pictures")
+
+
+class InvalidPicture(Exception):
+    pass
+
+
+def isHashedName(filename):
+    return bool(HASHED_NAME.match(filename))
+
+
+# Opens and checks the image, then cuts it to a square and makes every thumbnail size
+def makeThumbnails(data):
+    try:
+        with Image.open(BytesIO(data)) as probe:
+            if probe.format not in ALLOWED_FORMATS:
+                raise InvalidPicture("That file type is not supported")
+            if probe.width * probe.height > MAX_PIXELS:
+                raise InvalidPicture("That picture is too big")
+            probe.verify()
+
+        # verify() leaves the image unusable, so it is opened again for the real work
+        with Image.open(BytesIO(data)) as image:
+            image.seek(0)
+            image = image.convert("RGBA" if "A" in image.getbands() or image.mode == "P" else "RGB")
+            side = min(image.size)
+            left = (image.width - side) // 2
+            top = (image.height - side) // 2
+            square = image.crop((left, top, left + side, top + side))
+
+            thumbnails = {}
+            for name, size in THUMBNAIL_SIZES.items():
+                out = BytesIO()
+                square.resize((size, size), Image.LANCZOS).save(out, "WEBP", quality=82, method=4)
+                thumbnails[name] = out.getvalue()
+            return thumbnails
+    except (UnidentifiedImageError, OSError, SyntaxError, Image.DecompressionBombError):
+        raise InvalidPicture("That file is not a picture we can read")
+
+
+# Processes the upload and returns the url of every thumbnail, e.g. {"small": "/static/uploads/<hash>_64.webp", ...}
+# Identical uploads end up with the same names, so they are only written once
+def saveProfilePicture(data, timeout=20):
+    digest = hashlib.sha256(data).hexdigest()[:32]
+    names = {name: f"{digest}_{size}.webp" for name, size in THUMBNAIL_SIZES.items()}
+    os.makedirs(UPLOAD_FOLDER, exist_ok=True)
+
+    if not all(os.path.exists(os.path.join(UPLOAD_FOLDER, n)) for n in names.values()):
+        thumbnails = imageWorkers.submit(makeThumbnails, data).result(timeout=timeout)
+        for name, filename in names.items():
+            # written to a temp file first, so nobody gets served half a picture
+            # every upload gets its own temp file, two uploads of the same picture at once just both replace it
+            fd, temp = tempfile.mkstemp(dir=UPLOAD_FOLDER, suffix=".tmp")
+            try:
+                with os.fdopen(fd, "wb") as f:
+                    f.write(thumbnails[name])
+                os.replace(temp, os.path.join(UPLOAD_FOLDER, filename))
+            except BaseException:
+                os.remove(temp)
+                raise
+
+    return {name: UPLOAD_URL + filename for name, filename in names.items()}
+
+
+# Deletes the files of an old picture, unless another player still uses them
+# (picture and pictures.small are indexed, see migrations.py, so the check does not scan every player)
+def removeUnusedPicture(db, pictures):
+    for url in pictures:
+        if not url or not url.startswith(UPLOAD_URL):
+            continue
+        if db.players.find_one({"$or": [{"picture": url}, {"pictures.small": url}]}, {"_id": 1}):
+            continue
+        path = os.path.join(UPLOAD_FOLDER, url[len(UPLOAD_URL):])
+        if os.path.exists(path):
+            os.remove(path)
@@ -0,0 +1,185 @@
+## Puzzle Import - loads a whole file of sentences into a puzzle collection in one go, instead of add_sentence.py one by one.
+## The file is read as a stream (CSV with a header or JSON lines), in chunks, so it can be any size.
+## Every row is checked, gets its letter map, revealed letters and difficulty (see difficulty.py), and is skipped if the same sentence
+## (ignoring case, spaces and punctuation) is already in the collection or earlier in the file.
+##
+## python puzzle_import.py sentences.csv                       (into the endless pool)
+## python puzzle_import.py dota.jsonl --collection Dota        (into a category)
+## python puzzle_import.py big.csv --chunk 5000 --dry-run      (only checks the file)
+##
+## A row needs "sentence", and can have "hint" and "category" (the category defaults to --category or the collection).
+
+import csv
+import hashlib
+import json
+import random
+import re
+import string
+import time
+
+from difficulty import puzzleDifficulty
+
+# The collections the game reads puzzles from
+PUZZLE_COLLECTIONS = ["sentences", "Dota", "Earth", "LORUM_IPSUM", "Medsoe", "Science"]
+
+MAX_SENTENCE_LENGTH = 300
+
+
+# The sentence in the form used to spot duplicates: lowercase letters and digits with single spaces
+def normalizeSentence(sentence):
+    return " ".join(re.sub(r"[^a-z0-9 ]", " ", (sentence or "").lower()).split())
+
+
+def sentenceHash(sentence):
+    return hashlib.sha1(normalizeSentence(sentence).encode("utf-8")).hexdigest()
+
+
+# Letter maps for a whole chunk at once, every map is the numbers 1-26 shuffled over a-z (like makingTheLetterMap)
+def letterMaps(count, rng):
+    numbers = list(range(1, 27))
+    maps = []
+    for _ in range(count):
+        rng.shuffle(numbers)
+        maps.append(dict(zip(string.ascii_lowercase, numbers)))
+    return maps
+
+
+# Revealed letters for a whole chunk, 2-4 of the letters in each sentence (like LetterRandomiser)
+def revealedLetters(sentences, rng):
+    revealed = []
+    for sentence in sentences:
+        unique = sorted(set(c.lower() for c in sentence if c.isalpha()))
+        revealed.append(rng.sample(unique, min(rng.randint(2, 4), len(unique))) if unique else [])
+    return revealed
+
+
+# Returns the error for a row, or None when it is fine
+def validateRow(row):
+    for field in ("sentence", "category", "hint"):
+        if row.get(field) is not None and not isinstance(row[field], str):
+            return f"{field} is not text"
+    sentence = (row.get("sentence") or "").strip()
+    if not sentence:
+        return "sentence is missing"
+    if len(sentence) > MAX_SENTENCE_LENGTH:
+        return f"sentence is longer than {MAX_SENTENCE_LENGTH} characters"
+    if not any(c.isalpha() for c in sentence):
+        return "sentence has no letters"
+    return None
+
+
+# Reads the rows of a CSV (with a header line) or JSON lines file, one at a time, with their line number
+def readRows(path):
+    if path.endswith(".jsonl") or path.endswith(".ndjson"):
+        with open(path, encoding="utf-8") as f:
+            for number, line in enumerate(f, start=1):
+                if line.strip():
+                    try:
+                        row = json.loads(line)
+                    except json.JSONDecodeError as e:
+                        yield number, {"_error": f"not valid JSON ({e.msg})"}
+                        continue
+                    # a line like [1, 2] or "text" is valid JSON but not a row
+                    yield number, row if isinstance(row, dict) else {"_error": "not a JSON object"}
+    else:
+        with open(path, encoding="utf-8-sig", newline="") as f:
+            for number, row in enumerate(csv.DictReader(f), start=2):
+                yield number, row
+
+
+def chunked(rows, size):
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+# Turns a checked chunk of rows into puzzle documents
+def buildDocuments(rows, category, rng):
+    sentences = [row["sentence"].strip() for row in rows]
+    maps = letterMaps(len(rows), rng)
+    revealed = revealedLetters(sentences, rng)
+    return [{
+        "sentence": sentence,
+        "category": (row.get("category") or category).strip(),
+        "hint": (row.get("hint") or "").strip(),
+        "letterMap": letterMap,
+        "revealedLetters": letters,
+        "sentenceHash": sentenceHash(sentence),
+        "difficulty": puzzleDifficulty(sentence, letters)
+    } for row, sentence, letterMap, letters in zip(rows, sentences, maps, revealed)]
+
+
+# Imports the file into the collection and returns the counts, prints progress as it goes
+def importFile(collection, path, category=None, chunk_size=1000, dry_run=False, seed=None):
+    rng = random.Random(seed)
+    category = category or ("General" if collection.name == "sentences" else collection.name)
+    counts = {"rows": 0, "inserted": 0, "duplicates": 0, "invalid": 0}
+    seenInFile = set()
+    started = time.monotonic()
+
+    for chunk in chunked(readRows(path), chunk_size):
+        valid = []
+        for number, row in chunk:
+            counts["rows"] += 1
+            error = row.get("_error") or validateRow(row)
+            if error:
+                counts["invalid"] += 1
+                if counts["invalid"] <= 20:
+                    print(f"[IMPORT] line {number}: {error}")
+                continue
+            key = sentenceHash(row["sentence"])
+            if key in seenInFile:
+                counts["duplicates"] += 1
+                continue
+            seenInFile.add(key)
+            valid.append(row)
+
+        # one query per chunk for the sentences that are already in the collection
+        hashes = [sentenceHash(row["sentence"]) for row in valid]
+        existing = {d["sentenceHash"] for d in collection.find({"sentenceHash": {"$in": hashes}}, {"_id": 0, "sentenceHash": 1})}
+        fresh = [row for row, key in zip(valid, hashes) if key not in existing]
+        counts["duplicates"] += len(valid) - len(fresh)
+
+        if fresh:
+            docs = buildDocuments(fresh, category, rng)
+            if not dry_run:
+                collection.insert_many(docs, ordered=False)
+            counts["inserted"] += len(docs)
+
+        elapsed = time.monotonic() - started
+        print(f"[IMPORT] {counts['rows']} rows, {counts['inserted']} new, {counts['rows'] / max(elapsed, 1e-9):.0f} rows/s")
+
+    elapsed = time.monotonic() - started
+    counts["seconds"] = round(elapsed, 2)
+    counts["rowsPerSecond"] = round(counts["rows"] / max(elapsed, 1e-9))
+    return counts
+
+
+if __name__ == "__main__":
+    import argparse
+    import os
+    import pymongo
+    from dotenv import load_dotenv
+
+    parser = argparse.ArgumentParser(description="Bulk import of puzzles from a CSV or JSON lines file")
+    parser.add_argument("file")
+    parser.add_argument("--collection", default="sentences", choices=PUZZLE_COLLECTIONS)
+    parser.add_argument("--category", help="category for rows that don't have one")
+    parser.add_argument("--chunk", type=int, default=1000, help="rows per insert_many")
+    parser.add_argument("--dry-run", action="store_true", help="check the file without writing anything")
+    args = parser.parse_args()
+
+    load_dotenv()
+    client = pymongo.MongoClient(os.getenv("MONGO_URI"))
+    db = client["crackthecode"]
+    db[args.collection].create_index("sentenceHash")
+
+    result = importFile(db[args.collection], args.file, args.category, args.chunk, args.dry_run)
+    mode = " (dry run, nothing was saved)" if args.dry_run else ""
+    print(f"Done{mode}: {result['rows']} rows, {result['inserted']} new, {result['duplicates']} duplicates, "
+          f"{result['invalid']} invalid in {result['seconds']}s ({result['rowsPerSecond']} rows/s)")
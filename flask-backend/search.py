@@ -0,0 +1,62 @@
+## Search - prefix search for players and groups that can use an index.
+## Every player and group has a searchKey (the name in lowercase), set on signup / group creation and by migration 4.
+## A search is a range query on that key ("abc" <= key < "abc" + the highest character), so no regex is run on the user input at all.
+## Results come in pages sorted by (searchKey, _id), the cursor is "<_id>:<searchKey>" of the last row,
+## so names with the same key ("Bob" and "bob") are not skipped at a page boundary.
+
+from bson import ObjectId
+
+DEFAULT_LIMIT = 20
+MAX_LIMIT = 50
+
+
+# The normalized form of a name that is stored and searched on
+def searchKey(name):
+    return (name or "").strip().lower()
+
+
+def pageLimit(limit):
+    try:
+        limit = int(limit)
+    except (TypeError, ValueError):
+        return DEFAULT_LIMIT
+    return max(1, min(limit, MAX_LIMIT))
+
+
+# Splits a cursor into (searchKey, _id), ValueError when it is not one of ours
+def parseCursor(after):
+    lastId, _, lastKey = after.partition(":")
+    if not ObjectId.is_valid(lastId):
+        raise ValueError("Invalid cursor")
+    return lastKey, ObjectId(lastId)
+
+
+# Finds documents whose searchKey starts with the query, sorted by the key and _id
+# Returns the documents (without searchKey) and the cursor for the next page, or None when there are no more
+# A broken cursor raises ValueError
+def prefixSearch(collection, query, projection, after=None, limit=DEFAULT_LIMIT, extra=None):
+    prefix = searchKey(query)
+    if not prefix:
+        return [], None
+
+    filter_ = {"searchKey": {"$gte": prefix, "$lt": prefix + "\uffff"}}
+    if after:
+        lastKey, lastId = parseCursor(after)
+        filter_["$or"] = [{"searchKey": {"$gt": lastKey}}, {"searchKey": lastKey, "_id": {"$gt": lastId}}]
+    if extra:
+        filter_.update(extra)
+
+    limit = pageLimit(limit)
+    docs = list(collection.find(filter_, dict(projection, searchKey=1, _id=1))
+                .sort([("searchKey", 1), ("_id", 1)]).limit(limit + 1))
+
+    nextCursor = None
+    if len(docs) > limit:
+        last = docs[limit - 1]
+        nextCursor = f"{last['_id']}:{last['searchKey']}"
+    docs = docs[:limit]
+    for doc in docs:
+        doc.pop("searchKey", None)
+        if not projection.get("_id", 1):
+            doc.pop("_id", None)
+    return docs, nextCursor
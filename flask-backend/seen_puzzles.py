@@ -0,0 +1,91 @@
+## Seen Puzzles - remembers which endless puzzles a player has solved, so /get-puzzle does not give them again.
+## Every player has a small bloom filter in players.seen: a fixed array of 64 bit words (1 KB), no matter how
+## many puzzles they play. submitScore sets the bits of the solved puzzles with $bit, in the same write that
+## reads the filter back, and the filter starts over when it gets too full or too old to be accurate.
+## A false positive only means an unseen puzzle gets skipped, a solved one is never given again while it is in the filter.
+
+from datetime import datetime, timedelta
+from bson.int64 import Int64
+from pymongo import ReturnDocument
+import hashlib
+
+SEEN_WORDS = 128                 # 128 * 64 = 8192 bits
+SEEN_BITS = SEEN_WORDS * 64
+SEEN_HASHES = 3
+SEEN_CAPACITY = 1000             # about 3% false positives when full
+SEEN_MAX_AGE = timedelta(days=30)
+
+
+# The bits a puzzle id sets in the filter
+def bitPositions(puzzleId):
+    digest = hashlib.sha1(str(puzzleId).encode("utf-8")).digest()
+    return [int.from_bytes(digest[i * 4:i * 4 + 4], "big") % SEEN_BITS for i in range(SEEN_HASHES)]
+
+
+# $bit wants a signed 64 bit number, so the top bit is the negative one
+def wordMask(bits):
+    mask = 0
+    for bit in bits:
+        mask |= 1 << bit
+    return Int64(mask - (1 << 64) if mask >= 1 << 63 else mask)
+
+
+class SeenFilter:
+    def __init__(self, words=None):
+        self.words = [int(w) for w in words] if words else [0] * SEEN_WORDS
+
+    def __contains__(self, puzzleId):
+        return all((self.words[bit // 64] >> (bit % 64)) & 1 for bit in bitPositions(puzzleId))
+
+    # Only in this process, used to stop repeats inside a run before the score is submitted
+    def add(self, puzzleId):
+        for bit in bitPositions(puzzleId):
+            self.words[bit // 64] |= 1 << (bit % 64)
+
+
+def emptySeen(puzzleIds=()):
+    seen = SeenFilter()
+    for puzzleId in puzzleIds:
+        seen.add(puzzleId)
+    words = [Int64(w - (1 << 64) if w >= 1 << 63 else w) for w in seen.words]
+    return {"words": words, "count": len(puzzleIds), "since": datetime.utcnow()}
+
+
+# The $bit update that adds the puzzles, the masks are merged per word so every word is one operation
+def seenUpdate(puzzleIds):
+    perWord = {}
+    for puzzleId in puzzleIds:
+        for bit in bitPositions(puzzleId):
+            perWord.setdefault(bit // 64, []).append(bit % 64)
+    return {
+        "$bit": {f"seen.words.{word}": {"or": wordMask(bits)} for word, bits in perWord.items()},
+        "$inc": {"seen.count": len(puzzleIds)}
+    }
+
+
+# Adds the solved puzzles to the players filter and returns the filter as it is now (one write)
+# Starts a new filter when the player has none yet, or when it is full or older than SEEN_MAX_AGE
+def recordSeen(db, username, puzzleIds):
+    puzzleIds = list(dict.fromkeys(str(p) for p in puzzleIds))
+    if not puzzleIds:
+        return loadSeen(db, username)
+
+    player = db.players.find_one_and_update(
+        {"username": username, "seen.words": {"$size": SEEN_WORDS}},
+        seenUpdate(puzzleIds),
+        projection={"_id": 0, "seen": 1},
+        return_document=ReturnDocument.AFTER
+    )
+    seen = player.get("seen") if player else None
+    if seen and seen.get("count", 0) < SEEN_CAPACITY and seen.get("since", datetime.utcnow()) > datetime.utcnow() - SEEN_MAX_AGE:
+        return SeenFilter(seen["words"])
+
+    fresh = emptySeen(puzzleIds)
+    db.players.update_one({"username": username}, {"$set": {"seen": fresh}})
+    return SeenFilter(fresh["words"])
+
+
+def loadSeen(db, username):
+    player = db.players.find_one({"username": username}, {"_id": 0, "seen.words": 1})
+    words = (player or {}).get("seen", {}).get("words")
+    return SeenFilter(words if words and len(words) == SEEN_WORDS else None)
@@ -0,0 +1,196 @@
+## Sentence Pool - keeps the endless puzzles in memory so /get-puzzle does not pull the whole collection every time.
+## The pool is loaded once, then picks up new sentences (from add_sentence.py) with a small "newer than the last _id" query.
+## If the collection gets too big to hold, it stops caching and lets MongoDB pick with $sample instead.
+## The puzzles are also kept per difficulty band (see difficulty.py), so a band is picked from directly.
+## The band edges are the thirds of the pool itself, worked out on every full reload.
+## pick() can be given the players seen filter (see seen_puzzles.py) to skip the puzzles they have solved.
+
+from threading import Lock
+import random
+import time
+
+from difficulty import DEFAULT_EDGES, DIFFICULTY_BANDS, bandEdges, bandOf, checkBand, difficultyFilter, documentDifficulty, thirds
+
+# How many random puzzles are tried before giving up on finding one the player has not seen
+SEEN_TRIES = 20
+
+# Only the fields the game actually uses, so the pool stays small
+PUZZLE_FIELDS = {"_id": 1, "category": 1, "hint": 1, "sentence": 1, "revealedLetters": 1, "letterMap": 1, "difficulty": 1}
+
+
+# Turns a sentence document into the payload that is sent to the frontend
+def puzzlePayload(doc):
+    return {
+        "id": str(doc["_id"]),
+        "category": doc.get("category", "General"),
+        "hint": doc.get("hint", ""),
+        "sentence": doc.get("sentence", ""),
+        "revealedLetters": doc.get("revealedLetters", []),
+        "letterMap": doc.get("letterMap", {}),
+        "difficulty": doc.get("difficulty")
+    }
+
+
+class SentencePool:
+    def __init__(self, collection, max_size=20000, refresh_seconds=30, full_reload_seconds=600):
+        self.collection = collection
+        self.max_size = max_size
+        self.refresh_seconds = refresh_seconds
+        self.full_reload_seconds = full_reload_seconds
+
+        # Everything pick() reads is in this one snapshot, a reload builds a new one and swaps it in,
+        # so requests never see a half loaded pool and don't need the lock
+        self.state = self._emptyState()
+
+        self.last_refresh = 0
+        self.last_full_reload = 0
+        self.lock = Lock()  # only one thread (re)loads at a time
+
+    # Loads the whole pool from scratch, also used to drop deleted sentences now and then
+    def reload(self):
+        with self.lock:
+            self._reload()
+
+    # Only fetches sentences added since last time (empty result most of the time)
+    def refresh(self):
+        with self.lock:
+            self._refresh()
+
+    # For code in the same process that inserts a sentence, so the new puzzle shows up right away
+    def add(self, doc):
+        with self.lock:
+            if not self.state["too_big"]:
+                state = self._copyState(self.state)
+                self._add(state, doc)
+                self.state = state
+
+    # Picks a random puzzle payload, or None if there are no puzzles (in the band)
+    # band is one of DIFFICULTY_BANDS, an unknown band raises ValueError
+    # seen is a SeenFilter, when the player has seen everything tried a seen puzzle is given anyway
+    def pick(self, band=None, seen=None):
+        checkBand(band)
+        self._maybeRefresh()
+        state = self.state
+
+        if state["too_big"]:
+            bandQuery = difficultyFilter(band, state["edges"])
+            # the band is matched on the difficulty index before sampling
+            stages = [{"$match": bandQuery}] if bandQuery else []
+            size = SEEN_TRIES if seen is not None else 1
+            sampled = list(self.collection.aggregate(stages + [{"$sample": {"size": size}}, {"$project": PUZZLE_FIELDS}]))
+            if not sampled:
+                return None
+            unseen = [doc for doc in sampled if seen is None or str(doc["_id"]) not in seen]
+            return puzzlePayload((unseen or sampled)[0])
+
+        payloads = state["bands"][band] if band else state["payloads"]
+        if not payloads:
+            return None
+        if seen is not None:
+            for _ in range(SEEN_TRIES):
+                payload = random.choice(payloads)
+                if payload["id"] not in seen:
+                    return payload
+        return random.choice(payloads)
+
+    def size(self):
+        return len(self.state["payloads"])
+
+    # Only one thread reloads, the others keep picking from the old snapshot meanwhile
+    # The very first load is waited for, there is nothing to pick from before it
+    def _maybeRefresh(self):
+        if not self.last_full_reload:
+            with self.lock:
+                if not self.last_full_reload:
+                    self._reload()
+            return
+        if not self._isStale():
+            return
+        if not self.lock.acquire(blocking=False):
+            return
+        try:
+            # checked again, another thread may have just done it
+            now = time.monotonic()
+            if now - self.last_full_reload >= self.full_reload_seconds:
+                self._reload()
+            elif now - self.last_refresh >= self.refresh_seconds:
+                if self.state["too_big"]:
+                    # the collection may have shrunk again, so check with a full reload
+                    self._reload()
+                else:
+                    self._refresh()
+        finally:
+            self.lock.release()
+
+    def _isStale(self):
+        now = time.monotonic()
+        return now - self.last_full_reload >= self.full_reload_seconds or now - self.last_refresh >= self.refresh_seconds
+
+    # The two below are called with the lock held
+    def _reload(self):
+        state = self._emptyState()
+        if self.collection.estimated_document_count() > self.max_size:
+            state["too_big"] = True
+            # $sample is matched against the edges the backfill saved for the whole collection
+            state["edges"] = bandEdges(self.collection)
+        else:
+            docs = list(self.collection.find({}, PUZZLE_FIELDS).sort("_id", 1))
+            for doc in docs:
+                if doc.get("difficulty") is None:
+                    # added since the last difficulty backfill, so it is scored here
+                    doc["difficulty"] = documentDifficulty(doc)
+            state["edges"] = thirds([doc["difficulty"] for doc in docs])
+            for doc in docs:
+                self._add(state, doc)
+        self.state = state
+        self.last_refresh = self.last_full_reload = time.monotonic()
+
+    def _refresh(self):
+        last_id = self.state["last_id"]
+        query = {"_id": {"$gt": last_id}} if last_id is not None else {}
+        docs = list(self.collection.find(query, PUZZLE_FIELDS).sort("_id", 1).limit(self.max_size + 1))
+        if docs:
+            state = self._copyState(self.state)
+            for doc in docs:
+                self._add(state, doc)
+            if len(state["payloads"]) > self.max_size:
+                state = self._emptyState()
+                state["too_big"] = True
+                state["edges"] = bandEdges(self.collection)
+            self.state = state
+        self.last_refresh = time.monotonic()
+
+    def _emptyState(self):
+        return {
+            "payloads": [],   # ready to send puzzles
+            "ids": set(),     # the _ids in the pool
+            "bands": {band: [] for band in DIFFICULTY_BANDS},  # band -> payloads in that band
+            "last_id": None,  # highest _id loaded, used for the incremental refresh
+            "too_big": False, # true when the pool is above max_size and $sample is used
+            "edges": DEFAULT_EDGES  # where easy/medium and medium/hard split
+        }
+
+    def _copyState(self, state):
+        return {
+            "payloads": list(state["payloads"]),
+            "ids": set(state["ids"]),
+            "bands": {band: list(payloads) for band, payloads in state["bands"].items()},
+            "last_id": state["last_id"],
+            "too_big": state["too_big"],
+            "edges": state["edges"]
+        }
+
+    def _add(self, state, doc):
+        if doc["_id"] in state["ids"]:
+            return
+        state["ids"].add(doc["_id"])
+        if doc.get("difficulty") is None:
+            # added since the last difficulty backfill, so it is scored here
+            doc["difficulty"] = documentDifficulty(doc)
+        payload = puzzlePayload(doc)
+        state["payloads"].append(payload)
+        band = bandOf(payload["difficulty"], state["edges"])
+        if band:
+            state["bands"][band].append(payload)
+        if state["last_id"] is None or doc["_id"] > state["last_id"]:
+            state["last_id"] = doc["_id"]
@@ -0,0 +1,72 @@
+## Streaks - the nightly reset of streaks for players who missed the daily puzzle.
+## One aggregation finds the players that missed it, and the resets are sent in chunks with bulk_write,
+## so the time it takes follows how many players are reset and not how many players there are.
+## Can be run by hand as well: python streaks.py --dry-run
+
+from datetime import datetime, timedelta
+from pymongo import UpdateOne
+import time
+
+
+# Finds the players with a streak going, who have no daily_attempts document for that day
+def playersThatMissed(db, day):
+    return db.players.aggregate([
+        {"$match": {"streak.current": {"$gt": 0}}},
+        {"$lookup": {
+            "from": "daily_attempts",
+            "let": {"name": "$username"},
+            "pipeline": [
+                {"$match": {"$expr": {"$and": [
+                    {"$eq": ["$username", "$$name"]},
+                    {"$eq": ["$date", day]}
+                ]}}},
+                {"$limit": 1},
+                {"$project": {"_id": 1}}
+            ],
+            "as": "played"
+        }},
+        {"$match": {"played": {"$size": 0}}},
+        {"$project": {"_id": 0, "username": 1}}
+    ], allowDiskUse=True)
+
+
+# Resets the current streak for everyone who missed the puzzle on the given day (yesterday by default)
+# With dry_run it only counts them, returns how many players were (or would be) reset
+def resetMissedStreaks(db, day=None, dry_run=False, chunk_size=1000):
+    day = day or (datetime.utcnow() - timedelta(days=1)).strftime('%Y-%m-%d')
+    started = time.monotonic()
+
+    reset = 0
+    chunk = []
+    for player in playersThatMissed(db, day):
+        chunk.append(UpdateOne({"username": player["username"]}, {"$set": {"streak.current": 0}}))
+        if len(chunk) >= chunk_size:
+            reset += sendChunk(db, chunk, dry_run)
+            chunk = []
+            print(f"[STREAK RESET] {reset} players so far ({time.monotonic() - started:.1f}s)")
+    if chunk:
+        reset += sendChunk(db, chunk, dry_run)
+
+    mode = "would be reset (dry run)" if dry_run else "reset to 0"
+    print(f"[STREAK RESET] {reset} streaks {mode} for missing the puzzle on {day}, took {time.monotonic() - started:.2f}s")
+    return reset
+
+
+def sendChunk(db, chunk, dry_run):
+    if dry_run:
+        return len(chunk)
+    db.players.bulk_write(chunk, ordered=False)
+    return len(chunk)
+
+
+if __name__ == "__main__":
+    import os
+    import sys
+    import pymongo
+    from dotenv import load_dotenv
+
+    load_dotenv()
+    client = pymongo.MongoClient(os.getenv("MONGO_URI"))
+    db = client["crackthecode"]
+
+    resetMissedStreaks(db, dry_run="--dry-run" in sys.argv)
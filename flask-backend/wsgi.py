@@ -0,0 +1,7 @@
+## WSGI entry point for running the backend with more than one process, e.g.:
+## gunicorn -c gunicorn.conf.py wsgi:app
+
+from app import create_app
+
+# the migrations have already been run by gunicorn's on_starting hook, before the workers were started
+app = create_app(migrate=False)
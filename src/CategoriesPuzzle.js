@@ -27,6 +27,10 @@ const categoryMessages = {
   SCIENCE: "Science: Welcome to the smarty pants club."
 };
 
+// How many sentences are fetched at a time, and how close to the end the next page is loaded
+const PAGE_SIZE = 20;
+const PRELOAD_AHEAD = 3;
+
 const CategoriesPuzzle = ({ selectedCategory }) => {
   // State variables for sentences, user input, lives, etc.
   const [sentences, setSentences] = useState([]);
@@ -41,39 +45,68 @@ const CategoriesPuzzle = ({ selectedCategory }) => {
   const [showHint, setShowHint] = useState(false);
   const [hintText, setHintText] = useState("");
 
+  const [totalSentences, setTotalSentences] = useState(0);
+
   // Refs for input elements and timeouts
   const inputRefs = useRef([]);
   const timeoutRefs = useRef({});
+  // Cursor for the next page of sentences, null when everything is loaded
+  const nextCursorRef = useRef(null);
+  const loadingPageRef = useRef(false);
+
+  // Fetch sentences for the selected category from backend, one page at a time
+  const loadPage = (after) => {
+    const cursor = after ? `&after=${after}` : "";
+    return fetch(`http://127.0.0.1:5000/get-category/${selectedCategory}?limit=${PAGE_SIZE}${cursor}`)
+      .then((res) => res.json())
+      .then((fetchedData) => {
+        if (!fetchedData.success || !Array.isArray(fetchedData.sentences)) return;
+        const formatted = fetchedData.sentences.map(item => ({
+          sentence: item.sentence,
+          hint: item.hint
+        }));
+        nextCursorRef.current = fetchedData.next;
+        setSentences((prev) => (after ? [...prev, ...formatted] : formatted));
+      });
+  };
 
-  // Fetch sentences for the selected category from backend
   useEffect(() => {
     if (!selectedCategory) return;
 
-    fetch(`http://127.0.0.1:5000/get-category/${selectedCategory}`)
+    setSentences([]);
+    setCurrentSentenceIndex(0);
+    nextCursorRef.current = null;
+
+    // The count is asked for on its own, so "Sentence X of Y" is right before every page is loaded
+    fetch(`http://127.0.0.1:5000/get-category/${selectedCategory}/count`)
       .then((res) => res.json())
-      .then((fetchedData) => {
-        if (fetchedData.success && Array.isArray(fetchedData.sentences)) {
-          const formatted = fetchedData.sentences.map(item => ({
-            sentence: item.sentence,
-            hint: item.hint
-          }));
-          setSentences(formatted);
-          setCurrentSentenceIndex(0);
-        } else {
-          setSentences([]);
-        }
-      })
-      .catch((err) => {
-        console.error("Failed to load category data:", err);
-        setSentences([]);
-      });
+      .then((data) => setTotalSentences(data.success ? data.count : 0))
+      .catch(() => setTotalSentences(0));
+
+    loadPage(null).catch((err) => {
+      console.error("Failed to load category data:", err);
+      setSentences([]);
+    });
   }, [selectedCategory]);
 
+  // Load the next page a few sentences before the player runs out
+  useEffect(() => {
+    const cursor = nextCursorRef.current;
+    if (!cursor || loadingPageRef.current) return;
+    if (currentSentenceIndex + PRELOAD_AHEAD < sentences.length) return;
+
+    loadingPageRef.current = true;
+    loadPage(cursor)
+      .catch((err) => console.error("Failed to load more category data:", err))
+      .finally(() => { loadingPageRef.current = false; });
+  }, [sentences, currentSentenceIndex]);
+
   // Prepare the current sentence, reveal some letters, and reset state
   useEffect(() => {
     if (sentences.length === 0) return;
 
     const current = sentences[currentSentenceIndex];
+    if (!current) return; // the next page is still on its way
     const cleanAnswer = current.sentence.replace(/[^a-zA-Z]/g, '');
     const initialInput = Array(cleanAnswer.length).fill('');
 
@@ -121,7 +154,7 @@ const CategoriesPuzzle = ({ selectedCategory }) => {
 
         // If sentence is complete, move to next or show popup
         if (newInput.join('') === correctLetters.join('').toLowerCase()) {
-          if (currentSentenceIndex + 1 < sentences.length) {
+          if (currentSentenceIndex + 1 < Math.max(totalSentences, sentences.length)) {
             setTimeout(() => {
               setCurrentSentenceIndex((prev) => prev + 1);
             }, 1500);
@@ -186,7 +219,7 @@ const CategoriesPuzzle = ({ selectedCategory }) => {
       <div className="game-area">
         <div className="game-header">
           <h2 className="category">{selectedCategory}</h2>
-          <p>Sentence {currentSentenceIndex + 1} of {sentences.length}</p>
+          <p>Sentence {currentSentenceIndex + 1} of {Math.max(totalSentences, sentences.length)}</p>
           <p className="hint">{sentenceData?.hint}</p>
         </div>
 
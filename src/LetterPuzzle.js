@@ -7,6 +7,62 @@ import "./App.css";
 import hintCharacter from "./assets/pictures/gamepage/hint-character.png";
 import { v4 as uuidv4 } from "uuid";
 
+// Finished runs wait in localStorage until the backend has them, so a run is not lost when the connection drops
+// Every player has their own queue, so runs of one account are never sent with the token of another
+const QUEUE_PREFIX = "pendingScores:";
+
+// The username inside the token (the "sub" of the JWT), or null when it can't be read
+const tokenUser = (token) => {
+  try {
+    const payload = token.split(".")[1].replace(/-/g, "+").replace(/_/g, "/");
+    return JSON.parse(atob(payload)).sub || null;
+  } catch {
+    return null;
+  }
+};
+
+const readQueue = (token) => {
+  const user = tokenUser(token);
+  if (!user) return [];
+  try {
+    return JSON.parse(localStorage.getItem(QUEUE_PREFIX + user)) || [];
+  } catch {
+    return [];
+  }
+};
+
+const writeQueue = (token, queue) => {
+  const user = tokenUser(token);
+  if (user) localStorage.setItem(QUEUE_PREFIX + user, JSON.stringify(queue));
+};
+
+// Sends every queued run of the player in one request. Runs the backend answered for (saved, already sent or invalid)
+// leave the queue, the rest stay for the next try. Resolves to how many were saved, or null when the backend could not be reached
+const flushQueue = async (token) => {
+  const queue = readQueue(token);
+  if (!token || queue.length === 0) return 0;
+
+  try {
+    const res = await fetch("http://127.0.0.1:5000/submit-scores", {
+      method: "POST",
+      headers: {
+        "Content-Type": "application/json",
+        Authorization: `Bearer ${token}`
+      },
+      body: JSON.stringify({ scores: queue.slice(0, 100) })
+    });
+    if (!res.ok) return null;
+    const data = await res.json();
+    const answered = new Set(data.results.map((_, i) => queue[i].sessionId));
+    // runs queued while this request was out are kept as well
+    writeQueue(token, readQueue(token).filter((run) => !answered.has(run.sessionId)));
+    return data.saved;
+  } catch (err) {
+    console.error("Scores stay queued until the backend can be reached", err);
+    return null;
+  }
+};
+
 const LetterPuzzle = ({ onLoginClick, onSignupClick, isLoggedIn }) => {
   // State variables for game logic and UI
   const [sentence, setSentence] = useState("");
@@ -23,6 +79,7 @@ const LetterPuzzle = ({ onLoginClick, onSignupClick, isLoggedIn }) => {
   const [score, setScore] = useState(0);
   const [usedSentences, setUsedSentences] = useState([]);
   const [scoreSubmitted, setScoreSubmitted] = useState(false);
+  const [submitMessage, setSubmitMessage] = useState("");
   const [gameSessionId, setGameSessionId] = useState(uuidv4());
 
   // Refs for tracking correct answers, input elements, timeouts, and auth token
@@ -30,6 +87,9 @@ const LetterPuzzle = ({ onLoginClick, onSignupClick, isLoggedIn }) => {
   const inputRefs = useRef([]);
   const timeoutRefs = useRef({});
   const tokenRef = useRef(null);
+  // The puzzle on screen and the ones solved this run, sent with the score so the backend does not give them again
+  const puzzleIdRef = useRef(null);
+  const solvedIds = useRef([]);
 
   // On login state change, update the token reference
   useEffect(() => {
@@ -43,11 +103,45 @@ const LetterPuzzle = ({ onLoginClick, onSignupClick, isLoggedIn }) => {
     }
   }, [isLoggedIn]);
 
+  // Sends the runs left over from earlier (offline) sessions on login, and again when the browser is back online
+  useEffect(() => {
+    if (!isLoggedIn) return;
+    const sendQueued = () => flushQueue(tokenRef.current);
+    sendQueued();
+    window.addEventListener("online", sendQueued);
+    return () => window.removeEventListener("online", sendQueued);
+  }, [isLoggedIn]);
+
+  // Queues the finished run and tries to send the queue right away
+  const submitRun = async () => {
+    const token = tokenRef.current;
+    writeQueue(token, [
+      ...readQueue(token).filter((run) => run.sessionId !== gameSessionId),
+      {
+        score,
+        timestamp: new Date().toISOString(),
+        sessionId: gameSessionId,
+        puzzles: solvedIds.current,
+      }
+    ]);
+    const saved = await flushQueue(token);
+    setSubmitMessage(saved === null ? "No connection - the score will be sent later" : "Score received by the Detective!");
+    setScoreSubmitted(true);
+    setTimeout(() => setScoreSubmitted(false), 3000);
+  };
+
   // Fetch a unique puzzle from the backend, avoiding repeats
   const getUniquePuzzle = async () => {
     let attempts = 0;
     while (attempts < 10) {
-      const res = await fetch("http://127.0.0.1:5000/get-puzzle");
+      // Logged in players send their token, so they don't get puzzles they have solved before
+      const res = await fetch("http://127.0.0.1:5000/get-puzzle", {
+        headers: tokenRef.current ? { Authorization: `Bearer ${tokenRef.current}` } : {}
+      });
+      if (!res.ok) {
+        console.error("Failed to fetch puzzle", res.status);
+        return null;
+      }
       const data = await res.json();
       if (!usedSentences.includes(data.sentence)) {
         setUsedSentences((prev) => [...prev, data.sentence]);
@@ -64,6 +158,7 @@ const LetterPuzzle = ({ onLoginClick, onSignupClick, isLoggedIn }) => {
       .then((data) => {
         if (!data) return;
 
+        puzzleIdRef.current = data.id;
         setSentence(data.sentence);
         setCategory(data.category);
         setHint(data.hint);
@@ -138,6 +233,7 @@ const LetterPuzzle = ({ onLoginClick, onSignupClick, isLoggedIn }) => {
           setIsCorrect(true);
           setScore((prev) => prev + 1);
           correctCount.current += 1;
+          if (puzzleIdRef.current) solvedIds.current.push(puzzleIdRef.current);
 
           // Award extra life every 3 correct answers
           if (correctCount.current % 3 === 0) {
@@ -196,6 +292,7 @@ const LetterPuzzle = ({ onLoginClick, onSignupClick, isLoggedIn }) => {
     setUsedSentences([]);
     setScore(0);
     correctCount.current = 0;
+    solvedIds.current = [];
     setLives(10);
     setScoreSubmitted(false);
     setGameSessionId(uuidv4());
@@ -220,7 +317,7 @@ const LetterPuzzle = ({ onLoginClick, onSignupClick, isLoggedIn }) => {
           fontWeight: "bold",
           zIndex: 2000
         }}>
-          Score received by the Detective!
+          {submitMessage}
         </div>
       )}
 
@@ -333,30 +430,7 @@ const LetterPuzzle = ({ onLoginClick, onSignupClick, isLoggedIn }) => {
                 </span>
               </div>
             ) : (
-              <button
-                onClick={() => {
-                  fetch("http://127.0.0.1:5000/submit-score", {
-                    method: "POST",
-                    headers: {
-                      "Content-Type": "application/json",
-                      Authorization: `Bearer ${tokenRef.current}`
-                    },
-                    body: JSON.stringify({
-                      score,
-                      timestamp: new Date().toISOString(),
-                      sessionId: gameSessionId,
-                    }),
-                  })
-                    .then((res) => res.json())
-                    .then((data) => {
-                      setScoreSubmitted(true);
-                      setTimeout(() => setScoreSubmitted(false), 3000);
-                    })
-                    .catch((err) => {
-                      console.error("Failed to submit score", err);
-                    });
-                }}
-              >
+              <button onClick={submitRun}>
                 Submit Score
               </button>
             )}
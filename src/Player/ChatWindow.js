@@ -5,23 +5,23 @@
 import React, { useEffect, useState, useRef } from 'react';
 import './ChatWindow.css';
 
+// The live chat streams can be served by their own server (see gunicorn.stream.conf.py), set REACT_APP_STREAM_URL for it
+const STREAM_URL = process.env.REACT_APP_STREAM_URL || 'http://localhost:5000';
+
 const ChatWindow = ({ target, type, onClose }) => {
   const [messages, setMessages] = useState([]);
   const [newMessage, setNewMessage] = useState('');
   const token = localStorage.getItem('token') || '';
   const messagesEndRef = useRef(null);
+  const lastSeqRef = useRef(null); // newest message seq we have, so messages are never shown twice
 
+  // Load the chat once, then let the server push new messages over a live stream (no more polling)
   useEffect(() => {
-    fetchMessages();
-    const interval = setInterval(fetchMessages, 5000);
-    return () => clearInterval(interval);
-  }, [target, type]);
+    let source = null;
+    let closed = false;
+    setMessages([]);
+    lastSeqRef.current = null;
 
-  useEffect(() => {
-    scrollToBottom();
-  }, [messages]);
-
-  const fetchMessages = () => {
     fetch(`http://localhost:5000/chat/${type}/${target}`, {
       headers: { Authorization: `Bearer ${token}` }
     })
@@ -30,10 +30,34 @@ const ChatWindow = ({ target, type, onClose }) => {
         return res.json();
       })
       .then(data => {
-        if (data.success) setMessages(data.messages);
+        if (!data.success || closed) return;
+        setMessages(data.messages);
+        lastSeqRef.current = data.seq;
+
+        // EventSource can't send headers, so the token goes in the url
+        source = new EventSource(
+          `${STREAM_URL}/chat/${type}/${target}/stream?since=${data.seq}&jwt=${encodeURIComponent(token)}`
+        );
+        source.onmessage = (event) => {
+          const msg = JSON.parse(event.data);
+          if (lastSeqRef.current !== null && msg.seq <= lastSeqRef.current) return;
+          lastSeqRef.current = msg.seq;
+          // only keep the last 20, like the backend does
+          setMessages(prev => [...prev, msg].slice(-20));
+        };
+        source.onerror = () => console.error('Chat stream lost, the browser will reconnect');
       })
       .catch(err => console.error('Error fetching messages:', err));
-  };
+
+    return () => {
+      closed = true;
+      if (source) source.close();
+    };
+  }, [target, type]);
+
+  useEffect(() => {
+    scrollToBottom();
+  }, [messages]);
 
   const handleSend = () => {
     if (!newMessage.trim()) return;
@@ -47,10 +71,8 @@ const ChatWindow = ({ target, type, onClose }) => {
     })
       .then(res => res.json())
       .then(data => {
-        if (data.success) {
-          setNewMessage('');
-          fetchMessages();
-        }
+        // the message itself comes back through the stream
+        if (data.success) setNewMessage('');
       });
   };
 
@@ -11,7 +11,9 @@ import './FriendsBox.css';
 // Main FriendsBox component
 const FriendsBox = ({ onChat }) => {
   const [friends, setFriends] = useState([]); // List of current friends
+  const [friendsNext, setFriendsNext] = useState(null); // Cursor for the next page of friends
   const [requests, setRequests] = useState([]); // Incoming friend requests
+  const [requestsNext, setRequestsNext] = useState(null); // Cursor for the next page of requests
   const [searchQuery, setSearchQuery] = useState(''); // Search input value
   const [statusMessage, setStatusMessage] = useState(''); // Status/info messages
   const [searchResults, setSearchResults] = useState([]); // Results from player search
@@ -24,29 +26,38 @@ const FriendsBox = ({ onChat }) => {
     fetchRequests();
   }, []);
 
-  // Fetch current friends from backend
-  const fetchFriends = () => {
-    fetch('http://localhost:5000/get-friends', {
+  // Fetch current friends from backend, one page at a time
+  // Without a cursor the list starts over, with the "next" cursor the page is added to the end
+  const fetchFriends = (after = null) => {
+    const query = after ? `?after=${encodeURIComponent(after)}` : '';
+    fetch(`http://localhost:5000/get-friends${query}`, {
       headers: {
         'Authorization': `Bearer ${localStorage.getItem('token')}`
       }
     })
     .then(res => res.json())
     .then(data => {
-      if (data.success) setFriends(data.friends);
+      if (data.success) {
+        setFriends(prev => after ? [...prev, ...data.friends] : data.friends);
+        setFriendsNext(data.next);
+      }
     });
   };
 
-  // Fetch incoming friend requests from backend
-  const fetchRequests = () => {
-    fetch('http://localhost:5000/friend-requests', {
+  // Fetch incoming friend requests from backend, paged like the friends
+  const fetchRequests = (after = null) => {
+    const query = after ? `?after=${encodeURIComponent(after)}` : '';
+    fetch(`http://localhost:5000/friend-requests${query}`, {
       headers: {
         'Authorization': `Bearer ${localStorage.getItem('token')}`
       }
     })
     .then(res => res.json())
     .then(data => {
-      if (data.success) setRequests(data.friend_requests);
+      if (data.success) {
+        setRequests(prev => after ? [...prev, ...data.friend_requests] : data.friend_requests);
+        setRequestsNext(data.next);
+      }
     });
   };
 
@@ -88,8 +99,9 @@ const FriendsBox = ({ onChat }) => {
     .then(data => {
       setIsSending(false);
       if (data.success) {
-        setStatusMessage(`Friend request sent to ${username}`);
+        setStatusMessage(data.message || `Friend request sent to ${username}`);
         fetchRequests(); // Refresh requests list
+        fetchFriends(); // They may have asked too, then you are friends right away
       } else {
         setStatusMessage(`Failed to send request to ${username}`);
       }
@@ -237,6 +249,10 @@ const FriendsBox = ({ onChat }) => {
         ) : (
           <p className="dim">No friends yet</p>
         )}
+        {/* More friends than fit in one page */}
+        {friendsNext && (
+          <button className="send-button" onClick={() => fetchFriends(friendsNext)}>Load more</button>
+        )}
       </div>
 
       {/* Friend Requests Section */}
@@ -257,6 +273,9 @@ const FriendsBox = ({ onChat }) => {
         ) : (
           <p className="dim">No requests</p>
         )}
+        {requestsNext && (
+          <button className="send-button" onClick={() => fetchRequests(requestsNext)}>Load more</button>
+        )}
       </div>
     </div>
   );
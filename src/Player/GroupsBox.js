@@ -14,6 +14,7 @@ const GroupsBox = ({ onChat }) => {
   const [joinPassword, setJoinPassword] = useState('');
   const [joiningGroup, setJoiningGroup] = useState('');
   const [groupMembers, setGroupMembers] = useState({});
+  const [membersNext, setMembersNext] = useState({}); // group -> cursor for the next page of members
   const [currentPlayer, setCurrentPlayer] = useState('');
 
   const token = localStorage.getItem('token'); // Get the JWT token from localStorage
@@ -91,6 +92,23 @@ const GroupsBox = ({ onChat }) => {
     });
   };
 
+  // Fetch one page of members, without a cursor the list starts over, with the "next" cursor the page is added to the end
+  const fetchMembers = (groupname, after = null) => {
+    const query = after ? `?after=${encodeURIComponent(after)}` : '';
+    fetch(`http://localhost:5000/group-members/${groupname}${query}`, {
+      headers: { 'Authorization': `Bearer ${token}` }
+    })
+    .then(res => res.json())
+    .then(data => {
+      if (!data.success) return;
+      setGroupMembers(prev => ({
+        ...prev,
+        [groupname]: after ? [...(prev[groupname] || []), ...data.members] : data.members
+      }));
+      setMembersNext(prev => ({ ...prev, [groupname]: data.next }));
+    });
+  };
+
   // Expand/collapse members in a group
   const toggleMembers = (groupname) => {
     if (groupMembers[groupname]) {
@@ -101,13 +119,7 @@ const GroupsBox = ({ onChat }) => {
       });
     } else {
       // Fetch member list fresh
-      fetch(`http://localhost:5000//group-members/${groupname}`, {
-        headers: { 'Authorization': `Bearer ${token}` }
-      })
-      .then(res => res.json())
-      .then(data => {
-        setGroupMembers(prev => ({ ...prev, [groupname]: data.members }));
-      });
+      fetchMembers(groupname);
     }
   };
 
@@ -122,7 +134,7 @@ const GroupsBox = ({ onChat }) => {
       body: JSON.stringify({ group: groupname, username })
     })
     .then(res => res.json())
-    .then(() => toggleMembers(groupname)); // refresh member list
+    .then(() => fetchMembers(groupname)); // refresh member list
   };
 
   // UI returns here
@@ -198,6 +210,12 @@ const GroupsBox = ({ onChat }) => {
                     )}
                   </li>
                 ))}
+                {/* more members than fit in one page */}
+                {membersNext[group.name] && (
+                  <li>
+                    <button onClick={() => fetchMembers(group.name, membersNext[group.name])}>Load more</button>
+                  </li>
+                )}
               </ul>
             )}
           </div>
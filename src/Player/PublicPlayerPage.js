@@ -28,6 +28,25 @@ const PublicPlayerPage = () => {
       });
   }, [username, token]);
 
+  // Adds the next page of friends to the profile, the first page comes with the profile itself
+  const loadMoreFriends = () => {
+    fetch(`http://localhost:5000/public-friends/${username}?after=${encodeURIComponent(playerData.friendsNext)}`, {
+      headers: {
+        'Authorization': `Bearer ${token}`
+      }
+    })
+      .then(res => res.json())
+      .then(data => {
+        if (data.success) {
+          setPlayerData(prev => ({
+            ...prev,
+            friends: [...prev.friends, ...data.friends],
+            friendsNext: data.next
+          }));
+        }
+      });
+  };
+
   // Show loading message if player data isn't loaded yet
   if (!playerData) {
     return (
@@ -119,6 +138,10 @@ const PublicPlayerPage = () => {
                 ) : (
                   <p className="dim"><em>No friends listed</em></p>
                 )}
+                {/* More friends than fit in one page */}
+                {playerData.friendsNext && (
+                  <button className="send-button" onClick={loadMoreFriends}>Load more</button>
+                )}
               </div>
             </div>
           </div>
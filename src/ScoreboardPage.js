@@ -11,6 +11,9 @@ import arrowLeft from "./assets/pictures/scoreboard/arrow-left.png";
 import arrowRight from "./assets/pictures/scoreboard/arrow-right.png";
 import pageTurnSound from "./assets/sounds/scoreboard/page-turn.mp3";
 
+// How many of the user's scores are fetched at a time
+const MY_SCORES_BATCH = 100;
+
 const ScoreboardPage = ({ onLoginClick, onSignupClick, isLoggedIn }) => {
   // State for user's scores, top scores, expanded entry, pagination, and error
   const [myScores, setMyScores] = useState([]);
@@ -20,6 +23,8 @@ const ScoreboardPage = ({ onLoginClick, onSignupClick, isLoggedIn }) => {
   const [topPage, setTopPage] = useState(0);
   const [scoresPerPage, setScoresPerPage] = useState(30);
   const [loadError, setLoadError] = useState(false);
+  const [myNext, setMyNext] = useState(null); // cursor for the next page of the user's scores
+  const [myStats, setMyStats] = useState(null); // summary of all the user's runs
   const audio = new Audio(pageTurnSound);
 
   // Fetch top scores and user's scores on mount or login state change
@@ -31,32 +36,47 @@ const ScoreboardPage = ({ onLoginClick, onSignupClick, isLoggedIn }) => {
       });
 
     if (isLoggedIn) {
-      const token = localStorage.getItem("token");
-      fetch("http://127.0.0.1:5000/loggedin-player-scores", {
-        headers: { Authorization: `Bearer ${token}` },
+      loadMyScores(null);
+
+      // The summary comes from the stats the backend keeps, not from the score history
+      fetch("http://127.0.0.1:5000/loggedin-player-stats", {
+        headers: { Authorization: `Bearer ${localStorage.getItem("token")}` },
       })
         .then((res) => res.json())
-        .then((data) => {
-          if (data.success) {
-            // Sort user's scores in descending order
-            const sorted = [...data.scores].sort((a, b) => b.score - a.score);
-            setMyScores(sorted);
-            setLoadError(false);
-          } else {
-            setMyScores([]);
-            setLoadError(true);
-          }
-        })
-        .catch(() => {
-          setMyScores([]);
-          setLoadError(true);
-        });
+        .then((data) => setMyStats(data.success ? data.stats : null))
+        .catch(() => setMyStats(null));
     } else {
       setMyScores([]);
+      setMyNext(null);
+      setMyStats(null);
       setLoadError(false);
     }
   }, [isLoggedIn]);
 
+  // Fetch a page of the user's scores (already sorted by score), after is the cursor from the last page
+  const loadMyScores = (after) => {
+    const token = localStorage.getItem("token");
+    const cursor = after ? `&after=${encodeURIComponent(after)}` : "";
+    return fetch(`http://127.0.0.1:5000/loggedin-player-scores?limit=${MY_SCORES_BATCH}${cursor}`, {
+      headers: { Authorization: `Bearer ${token}` },
+    })
+      .then((res) => res.json())
+      .then((data) => {
+        if (data.success) {
+          setMyScores((prev) => (after ? [...prev, ...data.scores] : data.scores));
+          setMyNext(data.next);
+          setLoadError(false);
+        } else {
+          if (!after) setMyScores([]);
+          setLoadError(true);
+        }
+      })
+      .catch(() => {
+        if (!after) setMyScores([]);
+        setLoadError(true);
+      });
+  };
+
   // Dynamically calculate how many scores fit per page based on window height
   useEffect(() => {
     const calculateScoresPerPage = () => {
@@ -76,6 +96,10 @@ const ScoreboardPage = ({ onLoginClick, onSignupClick, isLoggedIn }) => {
     audio.play();
     setTimeout(() => {
       if (type === "my") {
+        // load more scores when the next page goes past the ones we have
+        if (direction > 0 && myNext && myScores.length < (myPage + 2) * scoresPerPage) {
+          loadMyScores(myNext);
+        }
         setMyPage((prev) => Math.max(0, prev + direction));
       } else if (type === "top") {
         setTopPage((prev) => Math.max(0, prev + direction));
@@ -101,6 +125,11 @@ const ScoreboardPage = ({ onLoginClick, onSignupClick, isLoggedIn }) => {
             {isLoggedIn ? (
               <>
                 <div className="score-header"><h1>My Scores</h1></div>
+                {myStats && myStats.runs > 0 && (
+                  <div className="score-summary">
+                    Runs: {myStats.runs} — Best: {myStats.best} — Average: {myStats.mean}
+                  </div>
+                )}
                 {loadError && (
                   <div className="error-message" style={{ color: "red", margin: "16px 0" }}>
                     Could not load your scores. Try logging out and in again.
@@ -142,7 +171,7 @@ const ScoreboardPage = ({ onLoginClick, onSignupClick, isLoggedIn }) => {
                     />
                   )}
                   {/* Show right arrow if more pages exist */}
-                  {myScores.length > (myPage + 1) * scoresPerPage && (
+                  {(myScores.length > (myPage + 1) * scoresPerPage || myNext) && (
                     <img
                       src={arrowRight}
                       className="arrow-button"